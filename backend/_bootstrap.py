@@ -0,0 +1,24 @@
+# backend/_bootstrap.py
+
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).resolve().parent
+ENV_PATH = BACKEND_DIR / ".env"
+
+
+@lru_cache(maxsize=None)
+def ensure_env() -> Path:
+    """
+    Load backend/.env and put backend/ on sys.path (so `app` imports), once
+    per process however many scripts call it. Paths come from this file, not
+    the working directory. Returns the .env path.
+    """
+    load_dotenv(dotenv_path=ENV_PATH)
+    backend = str(BACKEND_DIR)
+    if backend not in sys.path:
+        sys.path.append(backend)
+    return ENV_PATH
@@ -1,6 +1,130 @@
 # app/job_store.py
 
-from typing import Dict, Any
+import os
+import time
+import asyncio
+from typing import Dict, Any, Optional
 
-# Simple in-memory job store for now
-JOB_STORE: Dict[str, Dict[str, Any]] = {}
+import orjson
+
+JOB_TTL_SECONDS = 86400
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+
+
+class JobStore:
+    """
+    Job state keyed by job_id.
+
+    With REDIS_URL set, each job is a Redis hash (job:{id}) that expires after
+    JOB_TTL_SECONDS, so state is shared across workers and survives restarts.
+    Without it, falls back to an in-process dict with the same TTL eviction.
+    Field values are orjson-encoded so nested payloads (transactions, patterns)
+    round-trip unchanged.
+    """
+
+    def __init__(self, redis_url: str = "", ttl: int = JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._redis = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._expires_at: Dict[str, float] = {}
+
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.Redis.from_url(redis_url)
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, exp in self._expires_at.items() if exp <= now]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._expires_at.pop(job_id, None)
+
+    async def update(self, job_id: str, **fields):
+        if self._redis is not None:
+            key = self._key(job_id)
+            mapping = {k: orjson.dumps(v) for k, v in fields.items()}
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            return
+
+        self._evict_expired()
+        self._jobs.setdefault(job_id, {}).update(fields)
+        self._expires_at[job_id] = time.monotonic() + self.ttl
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self._redis is not None:
+            raw = await self._redis.hgetall(self._key(job_id))
+            if not raw:
+                return None
+            return {k.decode(): orjson.loads(v) for k, v in raw.items()}
+
+        self._evict_expired()
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+
+class JobQueue:
+    """
+    FIFO of job ids waiting for a worker.
+
+    With REDIS_URL set, ids go on a Redis list (jobs:queue) so any worker
+    process can pick them up and queued uploads survive a restart of the
+    process that accepted them. Without it, falls back to a bounded
+    in-process asyncio.Queue.
+
+    Both are bounded by `maxsize` (0 = unbounded): put() waits while the
+    queue is full. On Redis the length check and push are one Lua script,
+    so concurrent producers can't overshoot the cap.
+    """
+
+    KEY = "jobs:queue"
+    FULL_POLL_SECONDS = 0.1
+    # KEYS[1] = queue, ARGV = (job_id, maxsize); 1 if pushed, 0 if full
+    PUSH_IF_ROOM = """
+    if redis.call('LLEN', KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call('RPUSH', KEYS[1], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, redis_url: str = "", maxsize: int = 0):
+        self._redis = None
+        self.maxsize = maxsize
+        self._local = asyncio.Queue(maxsize=maxsize)
+
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.Redis.from_url(redis_url)
+
+    async def put(self, job_id: str):
+        if self._redis is not None:
+            if self.maxsize <= 0:
+                await self._redis.rpush(self.KEY, job_id)
+                return
+            while not await self._push_if_room(job_id):
+                await asyncio.sleep(self.FULL_POLL_SECONDS)
+            return
+        await self._local.put(job_id)
+
+    async def _push_if_room(self, job_id: str) -> bool:
+        return bool(await self._redis.eval(self.PUSH_IF_ROOM, 1, self.KEY, job_id, self.maxsize))
+
+    async def get(self) -> str:
+        if self._redis is not None:
+            _, job_id = await self._redis.blpop([self.KEY], timeout=0)
+            return job_id.decode()
+        return await self._local.get()
+
+    def task_done(self):
+        if self._redis is None:
+            self._local.task_done()
+
+
+JOB_STORE = JobStore(REDIS_URL)
@@ -1,13 +1,18 @@
 # app/jobs.py
 
+import os
+import asyncio
 import logging
+import orjson
+from itertools import islice
 from .parser import extract_transactions
 from .patterns import run_patterns
-from .llm_client import generate_sar, enrich_locations
+from .llm_client import generate_sar, stream_sar, SarStreamError, enrich_locations
 from .pdf_generator import make_pdf
-from .job_store import JOB_STORE
+from .job_store import JOB_STORE, JobQueue
 from gtts import gTTS
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 # Configure logging
 logging.basicConfig(
@@ -15,8 +20,20 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
+logger = logging.getLogger(__name__)
 
-HIGH_RISK_PATTERNS = {
+# Bounded job queue: at most JOB_WORKERS jobs in flight per process
+JOB_QUEUE_MAXSIZE = 256
+JOB_WORKERS = 4
+
+# gTTS runs in worker processes so long narratives never hold up the event loop
+_TTS_POOL = ProcessPoolExecutor(max_workers=2)
+
+# Parsing and rule evaluation are pure CPU and hold the GIL; run them on
+# other cores so the event loop keeps answering status polls
+_CPU_POOL = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+
+HIGH_RISK_PATTERNS = frozenset({
     "STRUCTURING_NEAR_THRESHOLD_CASH",
     "ATM_STRUCTURING_WITHDRAWALS",
     "INBOUND_SMURFING",
@@ -26,7 +43,7 @@ HIGH_RISK_PATTERNS = {
     "RAPID_OUTFLOW",
     "RAPID_CASH_TO_WIRE",
     "HIGH_RISK_JURISDICTION_WIRE",
-}
+})
 
 SAR_DRIVER_PRIORITY = [
     "FUNNELING_ACTIVITY",          # Mule / aggregation accounts (highest severity)
@@ -40,6 +57,9 @@ SAR_DRIVER_PRIORITY = [
     "P2P_MULTIPLE_TRANSFERS_SAME_DAY",  # LOW – supporting only
 ]
 
+# code -> rank (lower is more severe), built once at import
+_PRIORITY_RANK = {code: rank for rank, code in enumerate(SAR_DRIVER_PRIORITY)}
+
 SUPPORTING_INDICATORS_BY_DRIVER = {
     "LAYERING_ACTIVITY": [
         "RAPID_OUTFLOW",
@@ -57,25 +77,16 @@ SUPPORTING_INDICATORS_BY_DRIVER = {
     ],
 }
 
-def compute_supporting_indicators(patterns, main_driver):
-    pattern_codes = {p["code"] for p in patterns}
-
-    # 1. Explicit supporting patterns (if present)
-    supporting = [
-        code for code in pattern_codes
-        if code != main_driver
-    ]
+def compute_supporting_indicators(pattern_codes, main_driver):
+    # Explicit supporting patterns (if present) + implicit indicators
+    # inferred from the main driver, merged and deduped in one sort
+    inferred = SUPPORTING_INDICATORS_BY_DRIVER.get(main_driver, ())
+    return sorted((pattern_codes - {main_driver}).union(inferred))
 
-    # 2. Implicit indicators inferred from main driver
-    inferred = SUPPORTING_INDICATORS_BY_DRIVER.get(main_driver, [])
 
-    # Merge + dedupe
-    return sorted(set(supporting + inferred))
-
-
-def compute_case_summary(patterns, risk_band, final_recommendation):
-    main_driver = compute_main_sar_driver(patterns)
-    supporting = compute_supporting_indicators(patterns, main_driver)
+def compute_case_summary(pattern_codes, risk_band, final_recommendation):
+    main_driver = compute_main_sar_driver(pattern_codes)
+    supporting = compute_supporting_indicators(pattern_codes, main_driver)
 
     return {
         "risk_band": risk_band,
@@ -84,18 +95,14 @@ def compute_case_summary(patterns, risk_band, final_recommendation):
         "recommendation": final_recommendation,
     }
 
-def compute_main_sar_driver(patterns):
-    pattern_codes = [p["code"] for p in patterns]
-
-    for code in SAR_DRIVER_PRIORITY:
-        if code in pattern_codes:
-            return code
-
-    return None
-
-def should_recommend_no_sar(patterns, risk_score: int) -> bool:
-    pattern_codes = {p["code"] for p in patterns}
+def compute_main_sar_driver(pattern_codes):
+    best = min(
+        (_PRIORITY_RANK[code] for code in pattern_codes if code in _PRIORITY_RANK),
+        default=None,
+    )
+    return None if best is None else SAR_DRIVER_PRIORITY[best]
 
+def should_recommend_no_sar(pattern_codes, risk_score: int) -> bool:
     # If any major SAR driver exists → No SAR NOT allowed
     if pattern_codes & HIGH_RISK_PATTERNS:
         return False
@@ -106,106 +113,216 @@ def should_recommend_no_sar(patterns, risk_score: int) -> bool:
 
     return True
 
+# Risk band by clamped score: 0-2 Low, 3-6 Medium, 7+ High
+_BAND_LUT = ("Low",) * 3 + ("Medium",) * 4 + ("High",) * 64
+
+# Verdict indexed by (no_sar_allowed << 1) | (risk_score >= 7)
+_VERDICT_LUT = ("Review", "SAR", "No SAR", "No SAR")
+
+
 def compute_risk_band(score: int) -> str:
-    if score <= 2:
-        return "Low"
-    elif score <= 6:
-        return "Medium"
-    else:
-        return "High"
+    return _BAND_LUT[min(max(score, 0), len(_BAND_LUT) - 1)]
+
+
+def compute_final_recommendation(pattern_codes, risk_score: int) -> str:
+    no_sar_allowed = should_recommend_no_sar(pattern_codes, risk_score)
+    return _VERDICT_LUT[(no_sar_allowed << 1) | (risk_score >= 7)]
+
+
+def shutdown_pools():
+    _TTS_POOL.shutdown(wait=True, cancel_futures=True)
+    _CPU_POOL.shutdown(wait=True, cancel_futures=True)
+
+
+# Full transaction list lives on disk; the job result keeps a ref + preview
+RESULT_TX_LIMIT = 100
+RESULT_TX_PREVIEW = 20
 
+# How often a streaming SAR narrative is pushed to the job store as sar_partial
+SAR_PARTIAL_FLUSH_SECONDS = 0.25
 
-def compute_final_recommendation(patterns, risk_score: int) -> str:
-    if should_recommend_no_sar(patterns, risk_score):
-        return "No SAR"
 
-    if risk_score >= 7:
-        return "SAR"
+def _write_transactions(transactions, path: Path) -> Path:
+    with open(path, "wb") as f:
+        for tx in transactions:
+            f.write(orjson.dumps(tx, default=str))
+            f.write(b"\n")
+    return path
 
-    return "Review"
 
+def load_transactions(ref: str, limit: int = RESULT_TX_LIMIT):
+    """Reads up to `limit` transactions back from a job's JSONL file."""
+    with open(ref, "rb") as f:
+        return [orjson.loads(line) for line in islice(f, limit)]
 
 
-def process_uploaded_file(job_id: str):
-    logging.info(f"Starting job {job_id}")
-    JOB_STORE[job_id]["status"] = "parsing"
-    file_path = JOB_STORE[job_id]["file"]
+LOCATION_FIELDS = ("location_city", "location_country", "location_lat", "location_lng")
 
-    print("JOB STATUS UPDATE:", JOB_STORE[job_id]["status"])
+
+def _copy_locations(node, locations):
+    """
+    Patterns run before location enrichment, so the transactions nested in
+    their matches have no location_* fields. Fills them in from
+    `locations` (stripped Details -> fields), the key enrichment uses too.
+    """
+    if isinstance(node, list):
+        for item in node:
+            _copy_locations(item, locations)
+    elif isinstance(node, dict):
+        if "Details" in node:
+            loc = locations.get((node.get("Details") or "").strip())
+            if loc:
+                node.update(loc)
+        else:
+            for value in node.values():
+                _copy_locations(value, locations)
+
+
+def _location_fields(transactions):
+    locations = {}
+    for tx in transactions:
+        if "location_country" in tx:
+            locations.setdefault(
+                (tx.get("Details") or "").strip(),
+                {k: tx.get(k) for k in LOCATION_FIELDS},
+            )
+    return locations
+
+
+def _run_gtts(sar_text: str, audio_path: Path) -> Path:
+    tts = gTTS(text=sar_text, lang='en')
+    tts.save(str(audio_path))
+    return audio_path
+
+
+async def _make_pdf(job_id: str, sar_text: str) -> Path:
+    pdf_path = await asyncio.to_thread(make_pdf, job_id, sar_text)
+    # Audio runs alongside; once the PDF is out it is what's left, so the
+    # status moves on to "audio" as it did when the two ran in sequence
+    await JOB_STORE.update(job_id, status="audio")
+    return pdf_path
+
+
+async def _generate_sar_streaming(job_id: str, transactions, patterns, risk_score, risk_band) -> str:
+    """
+    Streams the SAR narrative, publishing the text so far as sar_partial
+    (at most every SAR_PARTIAL_FLUSH_SECONDS) for /api/sar/{job_id}/stream.
+    If the stream fails, falls back to generate_sar, which retries and
+    degrades to the deterministic narrative.
+    """
+    loop = asyncio.get_running_loop()
+    parts = []
+    last_flush = loop.time()
     try:
-        # 1) Parse transactions
-        logging.info(f"Job {job_id}: Parsing transactions from {file_path}")
-        transactions = extract_transactions(file_path)
+        async for chunk in stream_sar(transactions, patterns, risk_score=risk_score, risk_band=risk_band):
+            parts.append(chunk)
+            now = loop.time()
+            if now - last_flush >= SAR_PARTIAL_FLUSH_SECONDS:
+                last_flush = now
+                await JOB_STORE.update(job_id, sar_partial="".join(parts))
+    except SarStreamError as e:
+        logger.warning("Job %s: SAR stream failed (%s), retrying without streaming", job_id, e)
+        sar_text = await generate_sar(transactions, patterns, risk_score=risk_score, risk_band=risk_band)
+    else:
+        sar_text = "".join(parts)
+    await JOB_STORE.update(job_id, sar_partial=sar_text)
+    return sar_text
 
-        logging.info(f"Job {job_id}: Parsed {len(transactions)} transactions")
-        print(f"Parsed {len(transactions)} transactions")
-        for i, tx in enumerate(transactions[:5]):
-            print(f"TX {i}: {tx['Date']} | {tx['direction']} | {tx['Type']} | {tx['amount']} | {tx['Details']}")
 
-        # 1.5) Enrich with Location Data (LLM)
-        logging.info(f"Job {job_id}: Enriching locations")
-        JOB_STORE[job_id]["status"] = "enriching"
-        transactions, location_summary = enrich_locations(transactions)
-        logging.info(f"Job {job_id}: Location enrichment complete. Summary: {location_summary}")
-        print(f"Location summary: {location_summary}")
+async def process_uploaded_file(job_id: str):
+    logger.info("Starting job %s", job_id)
+    job = await JOB_STORE.get(job_id)
+    file_path = job["file"]
+    await JOB_STORE.update(job_id, status="parsing")
+    loop = asyncio.get_running_loop()
+    enrichment = None
+
+    try:
+        # 1) Parse transactions
+        logger.info("Job %s: Parsing transactions from %s", job_id, file_path)
+        if Path(file_path).suffix.lower() == ".pdf":
+            # PDF pages fan out over _CPU_POOL from this thread, which only
+            # coordinates (and checks the parse cache)
+            transactions = await asyncio.to_thread(extract_transactions, file_path, _CPU_POOL)
+        else:
+            transactions = await loop.run_in_executor(_CPU_POOL, extract_transactions, file_path)
+
+        logger.info("Job %s: Parsed %d transactions", job_id, len(transactions))
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, tx in enumerate(transactions[:5]):
+                logger.debug(
+                    "TX %d: %s | %s | %s | %s | %s",
+                    i, tx["Date"], tx["direction"], tx["Type"], tx["amount"], tx["Details"],
+                )
+
+        # 1.5) Location enrichment (LLM), in the background: rules and the
+        # SAR prompt don't read location fields, so both run meanwhile
+        logger.info("Job %s: Enriching locations", job_id)
+        await JOB_STORE.update(job_id, status="enriching")
+        enrichment = asyncio.create_task(enrich_locations(transactions))
 
         # 2) Run rules / patterns
-        logging.info(f"Job {job_id}: Running patterns")
-        JOB_STORE[job_id]["status"] = "rules"
-        patterns, risk_score = run_patterns(transactions)
-        logging.info(f"Job {job_id}: Patterns complete. Risk score: {risk_score}")
+        logger.info("Job %s: Running patterns", job_id)
+        await JOB_STORE.update(job_id, status="rules")
+        patterns, risk_score = await loop.run_in_executor(_CPU_POOL, run_patterns, transactions)
+        logger.info("Job %s: Patterns complete. Risk score: %s", job_id, risk_score)
 
         # 3) Compute risk band + recommendation
-        logging.info(f"Job {job_id}: Computing risk band and recommendation")
+        logger.info("Job %s: Computing risk band and recommendation", job_id)
+        # Codes are built once and shared by every verdict/summary helper
+        pattern_codes = frozenset(p["code"] for p in patterns)
         risk_band = compute_risk_band(risk_score)
-        final_recommendation = compute_final_recommendation(patterns, risk_score)
+        final_recommendation = compute_final_recommendation(pattern_codes, risk_score)
 
         case_summary = compute_case_summary(
-        patterns,
+        pattern_codes,
         risk_band,
         final_recommendation
         )
 
         # 4) Generate SAR narrative via LLM
-        logging.info(f"Job {job_id}: Generating SAR narrative")
-        JOB_STORE[job_id]["status"] = "llm"
-        print("Entering LLM stage")
-        sar_text = generate_sar(
-                          transactions,
-                          patterns,
-                          risk_score=risk_score,
-                          risk_band=risk_band,
-                    )
-        print("LLM completed")
-        logging.info(f"Job {job_id}: SAR narrative generated")
-        
-        # 5) Generate PDF from SAR narrative
-        logging.info(f"Job {job_id}: Generating PDF")
-        JOB_STORE[job_id]["status"] = "pdf"
-        pdf_path = make_pdf(job_id, sar_text)
-        logging.info(f"Job {job_id}: PDF generated at {pdf_path}")
-
-        # 5.5) Generate Audio from SAR narrative
-        logging.info(f"Job {job_id}: Generating Audio")
-        JOB_STORE[job_id]["status"] = "audio"
+        logger.info("Job %s: Generating SAR narrative", job_id)
+        await JOB_STORE.update(job_id, status="llm")
+        sar_text = await _generate_sar_streaming(
+            job_id,
+            transactions,
+            patterns,
+            risk_score,
+            risk_band,
+        )
+        logger.info("Job %s: SAR narrative generated", job_id)
+
+        if not enrichment.done():
+            await JOB_STORE.update(job_id, status="enriching")
+        transactions, location_summary = await enrichment
+        logger.info("Job %s: Location enrichment complete. Summary: %s", job_id, location_summary)
+        locations = _location_fields(transactions)
+        if locations:
+            for p in patterns:
+                _copy_locations(p.get("matches"), locations)
         
+        # 5) Generate PDF + Audio from SAR narrative (independent, run concurrently)
+        logger.info("Job %s: Generating PDF and Audio", job_id)
+        await JOB_STORE.update(job_id, status="pdf")
+
         # Create audio path: backend/uploads/{job_id}_sar.mp3
-        audio_filename = f"{job_id}_sar.mp3"
-        # We need UPLOAD_DIR. Ideally it should be imported or derived. 
-        # Using file_path.parent since file_path is already a Path object from extract_transactions call or similar?
-        # Actually JOB_STORE[job_id]["file"] is a string. Let's make it a Path.
-        file_path_obj = Path(file_path)
-        upload_dir = file_path_obj.parent
-        audio_path = upload_dir / audio_filename
-        
-        tts = gTTS(text=sar_text, lang='en')
-        tts.save(str(audio_path))
-        logging.info(f"Job {job_id}: Audio generated at {audio_path}")
+        # The stored "file" is a string path, upload dir is its parent.
+        audio_path = Path(file_path).parent / f"{job_id}_sar.mp3"
+        tx_path = Path(file_path).parent / f"{job_id}_transactions.jsonl"
+
+        pdf_path, audio_path, tx_path = await asyncio.gather(
+            _make_pdf(job_id, sar_text),
+            loop.run_in_executor(_TTS_POOL, _run_gtts, sar_text, audio_path),
+            asyncio.to_thread(_write_transactions, transactions, tx_path),
+        )
+        logger.info("Job %s: PDF generated at %s", job_id, pdf_path)
+        logger.info("Job %s: Audio generated at %s", job_id, audio_path)
 
         # 6) Save final result
-        JOB_STORE[job_id]["status"] = "done"
-        JOB_STORE[job_id]["result"] = {
-            "transactions": transactions[:100],
+        result = {
+            "transactions_ref": str(tx_path),
+            "transactions_preview": transactions[:RESULT_TX_PREVIEW],
+            "transaction_count": len(transactions),
             "patterns": patterns,
             "risk_score": risk_score,
             "risk_band": risk_band,
@@ -214,16 +331,30 @@ def process_uploaded_file(job_id: str):
             "sar_text": sar_text,
             "location_summary": location_summary,
             }
-        JOB_STORE[job_id]["pdf"] = pdf_path
-        JOB_STORE[job_id]["audio"] = str(audio_path)
-        logging.info(f"Job {job_id}: Job compconsted successfully")
+        await JOB_STORE.update(
+            job_id,
+            status="done",
+            result=result,
+            pdf=str(pdf_path),
+            audio=str(audio_path),
+        )
+        logger.info("Job %s: Job completed successfully", job_id)
 
     except Exception as e:
-        import traceback
-        error_msg = str(e) + "\n" + traceback.format_exc()
-        logging.error(f"Job {job_id} failed: {error_msg}")
-        with open("debug_error.log", "w") as f:
-            f.write(error_msg)
-            
-        JOB_STORE[job_id]["status"] = "error"
-        JOB_STORE[job_id]["error"] = str(e)
+        if enrichment is not None:
+            enrichment.cancel()
+        logger.exception("Job %s failed", job_id)
+        await JOB_STORE.update(job_id, status="error", error=str(e))
+
+
+async def job_worker(queue: JobQueue):
+    """
+    Pulls job ids off the queue and runs them one at a time, so the number
+    of concurrent jobs (and OpenRouter calls) is bounded by the worker count.
+    """
+    while True:
+        job_id = await queue.get()
+        try:
+            await process_uploaded_file(job_id)
+        finally:
+            queue.task_done()
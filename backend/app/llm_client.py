@@ -1,18 +1,171 @@
 import os
-import json
-import requests
+import re
+import time
+import random
+import asyncio
+import heapq
+import hashlib
+import aiohttp
 import logging
+import orjson
+from collections import OrderedDict
 from dotenv import load_dotenv
 from pathlib import Path
+from .prompt_cache import PROMPT_CACHE, LOCATION_CACHE, prompt_key
 
 # Explicitly load .env from backend root
 base_dir = Path(__file__).resolve().parent.parent
 env_path = base_dir / ".env"
 load_dotenv(dotenv_path=env_path)
 
+logger = logging.getLogger(__name__)
+
 OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY", "").strip()
+# Set LOC_DEBUG to dump raw location responses to location_debug_raw.log
+LOCATION_DEBUG = bool(os.getenv("LOC_DEBUG", "").strip())
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Cap concurrent OpenRouter calls across all jobs (client-side throttling)
+OPENROUTER_MAX_CONCURRENCY = 5
+_OPENROUTER_LIMIT = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+
+# Shared keep-alive pool so jobs reuse the TLS connection to OpenRouter
+HTTP_POOL_MAXSIZE = 32
+HTTP_POOL_PER_HOST = 16
+HTTP_CONNECT_TIMEOUT_SECONDS = 5
+HTTP_KEEPALIVE_SECONDS = 60
+HTTP_DNS_CACHE_SECONDS = 300
+
+# Retry rate limits, 5xx, timeouts and dropped connections before giving up
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_MIN = 1
+RETRY_BACKOFF_MAX = 8
+RETRY_JITTER = 1
+RETRY_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ClientError)
+
+# Shared HTTP session, created lazily inside the running event loop
+_SESSION = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_MAXSIZE,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=HTTP_DNS_CACHE_SECONDS,
+        )
+        _SESSION = aiohttp.ClientSession(
+            connector=connector,
+            json_serialize=lambda obj: orjson.dumps(obj).decode(),
+        )
+    return _SESSION
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """Creates the shared session up front (app startup) instead of on first call."""
+    return _get_session()
+
+
+async def close_session():
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+
+# SAR narratives for repeat inputs (re-uploads, retries), LRU-capped with a TTL
+SAR_CACHE_MAX_ENTRIES = 512
+SAR_CACHE_TTL_SECONDS = 86400
+_SAR_CACHE = OrderedDict()  # key -> (expires_at, sar_text)
+
+
+def _sar_cache_key(transactions, patterns, risk_score, risk_band) -> str:
+    tx_hash = hashlib.sha256(orjson.dumps(transactions or [], default=str)).hexdigest()
+    codes = sorted(p.get("code") or "" for p in patterns or [])
+    payload = orjson.dumps((codes, risk_band, risk_score, tx_hash), default=str)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _sar_cache_get(key: str):
+    entry = _SAR_CACHE.get(key)
+    if entry is None:
+        return None
+    expires_at, sar_text = entry
+    if expires_at <= time.monotonic():
+        del _SAR_CACHE[key]
+        return None
+    _SAR_CACHE.move_to_end(key)
+    return sar_text
+
+
+def _sar_cache_set(key: str, sar_text: str):
+    _SAR_CACHE[key] = (time.monotonic() + SAR_CACHE_TTL_SECONDS, sar_text)
+    _SAR_CACHE.move_to_end(key)
+    while len(_SAR_CACHE) > SAR_CACHE_MAX_ENTRIES:
+        _SAR_CACHE.popitem(last=False)
+
+
+def _retry_after_seconds(headers):
+    """Seconds from a Retry-After header, or None if absent/unparseable."""
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _should_retry_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+async def _post_openrouter(headers, body, timeout):
+    """
+    POSTs to OpenRouter over the shared session, retrying 429 (honouring
+    Retry-After), 5xx, timeouts and client errors with jittered exponential
+    backoff, so concurrent jobs don't retry in lockstep. Other 4xx (auth,
+    bad request) are returned immediately.
+    Returns (status, raw response bytes); re-raises the last network error.
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        delay = min(
+            RETRY_BACKOFF_MAX,
+            RETRY_BACKOFF_MIN * (2 ** attempt) + random.uniform(0, RETRY_JITTER),
+        )
+        last_attempt = attempt == RETRY_ATTEMPTS - 1
+        try:
+            async with _OPENROUTER_LIMIT:
+                async with _get_session().post(
+                    OPENROUTER_URL,
+                    headers=headers,
+                    json=body,
+                    timeout=aiohttp.ClientTimeout(
+                        total=timeout, connect=HTTP_CONNECT_TIMEOUT_SECONDS
+                    ),
+                ) as resp:
+                    status = resp.status
+                    retry_after = _retry_after_seconds(resp.headers)
+                    raw = await resp.read()
+        except RETRY_EXCEPTIONS as e:
+            if last_attempt:
+                raise
+            logger.warning("OpenRouter request failed (%s), retrying in %.2fs", type(e).__name__, delay)
+            await asyncio.sleep(delay)
+            continue
+
+        if not _should_retry_status(status) or last_attempt:
+            return status, raw
+
+        if status == 429 and retry_after is not None:
+            delay = min(RETRY_BACKOFF_MAX, retry_after)
+        logger.warning("OpenRouter returned %s, retrying in %.2fs", status, delay)
+        await asyncio.sleep(delay)
+
+
+SAR_MODEL = "google/gemini-2.0-flash-lite-preview-02-05:free"
 
 SAR_PROMPT_TEMPLATE = """
 You are an experienced AML Investigator.
@@ -71,53 +224,126 @@ risk_score: {risk_score}
 risk_band: {risk_band}
 """
 
+SAR_PROMPT_FIELDS = ("transactions", "patterns", "risk_score", "risk_band")
+
+
+def _split_template(template: str, fields) -> tuple:
+    """
+    Splits a template into the literal segments around its placeholders
+    so prompts can be assembled with one join instead of str.format.
+    """
+    parts = []
+    rest = template
+    for field in fields:
+        head, rest = rest.split("{" + field + "}", 1)
+        parts.append(head)
+    parts.append(rest)
+    return tuple(parts)
+
+
+_SAR_PROMPT_PARTS = _split_template(SAR_PROMPT_TEMPLATE, SAR_PROMPT_FIELDS)
+
+
+def _build_sar_prompt(tx_block: str, patterns_json: str, risk_score, risk_band) -> str:
+    p0, p1, p2, p3, p4 = _SAR_PROMPT_PARTS
+    return "".join((
+        p0, tx_block,
+        p1, patterns_json,
+        p2, str(risk_score if risk_score is not None else "N/A"),
+        p3, str(risk_band if risk_band is not None else "N/A"),
+        p4,
+    ))
+
+# Currency symbols, thousands separators and whitespace dropped from amounts
+_AMT_STRIP = re.compile(r"[\s$,]")
+
+# Direction-aware wording (critical)
+_FLOW_BY_DIRECTION = {"inbound": "credit", "outbound": "debit"}
+
+
 def format_tx_for_sar(tx: dict) -> str:
     date = tx.get("Date", "Unknown date")
-    # Ensure safe access for Type as it can be None
-    channel = (tx.get("Type") or "unknown")
-    if channel:
-        channel = channel.upper()
-    else:
-        channel = "UNKNOWN"
-        
+    # Type can be None, so fall back before upper-casing
+    channel = (tx.get("Type") or "unknown").upper()
     details = tx.get("Details", "no description")
 
-    amount = tx.get("amount")
-    direction = tx.get("direction")
-
     # Normalize amount
-    amt = (
-        str(amount)
-        .replace("$", "")
-        .replace(",", "")
-        .strip()
-        if amount else "0"
-    )
+    amount = tx.get("amount")
+    amt = _AMT_STRIP.sub("", str(amount)) if amount else "0"
 
-    # Direction-aware wording (critical)
-    if direction == "inbound":
-        flow = "credit"
-    elif direction == "outbound":
-        flow = "debit"
-    else:
-        flow = "transaction"
+    flow = _FLOW_BY_DIRECTION.get(tx.get("direction"), "transaction")
 
     return f"{date} – {flow} of ${amt} via {channel} – {details}"
 
-def _fallback_sar(transactions, patterns, risk_score=None, risk_band=None):
+
+# The narrative only needs a handful of examples; send the strongest few
+SAR_PROMPT_MAX_TXS = 20
+_HIGH_SIGNAL_CHANNELS = frozenset({"WIRE", "CRYPTO", "CASH"})
+
+
+def _tx_signal(tx: dict) -> float:
+    amount = tx.get("amount")
+    try:
+        value = abs(float(_AMT_STRIP.sub("", str(amount)))) if amount else 0.0
+    except ValueError:
+        value = 0.0
+    channel = (tx.get("Type") or "").upper()
+    return value * (3 if channel in _HIGH_SIGNAL_CHANNELS else 1)
+
+
+def select_txs_for_sar(transactions, limit: int = SAR_PROMPT_MAX_TXS) -> list:
+    """
+    Drops exact duplicate rows, then keeps the `limit` highest-signal
+    transactions (amount, weighted up for wire/crypto/cash) in their
+    original order.
+    """
+    seen = set()
+    unique = []
+    for tx in transactions or []:
+        key = (tx.get("Date"), tx.get("amount"), tx.get("Type"), tx.get("Details"))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(tx)
+
+    if len(unique) <= limit:
+        return unique
+    top = heapq.nlargest(limit, range(len(unique)), key=lambda i: _tx_signal(unique[i]))
+    return [unique[i] for i in sorted(top)]
+
+
+def format_txs_for_sar(transactions) -> list:
+    """
+    Formats a batch of transactions once; used for the SAR prompt and
+    the fallback narrative's sample.
+    """
+    return list(map(format_tx_for_sar, transactions))
+
+
+# The fallback narrative quotes the statement's first rows, in order
+FALLBACK_SAMPLE_TXS = 5
+
+
+def _fallback_sample(transactions) -> list:
+    return format_txs_for_sar((transactions or [])[:FALLBACK_SAMPLE_TXS])
+
+
+def _fallback_sar(formatted_txs, patterns, risk_score=None, risk_band=None):
     """
     Used when LLM is unavailable or returns error.
     Still follows the required 1–5 structure in a simple deterministic way.
+    Takes the statement-order sample from _fallback_sample, not the
+    signal-ranked rows that go in the prompt.
     """
-    logging.info("Using fallback SAR generation")
-    tx_sample = transactions[:5] if transactions else []
-    pattern_codes = [p.get("code") for p in patterns or [] if p.get("code")]
+    logger.info("Using fallback SAR generation")
+    tx_sample = formatted_txs[:FALLBACK_SAMPLE_TXS] if formatted_txs else []
+    pattern_codes = [code for p in patterns or [] if (code := p.get("code"))]
 
     lines = []
 
     # 1. Summary of Activity
     lines.append("1. Summary of Activity")
-    if not transactions:
+    if not formatted_txs:
         lines.append("The account shows limited activity with no transactions available for review.")
     else:
         lines.append(
@@ -131,8 +357,8 @@ def _fallback_sar(transactions, patterns, risk_score=None, risk_band=None):
     lines.append("2. What Happened (Factual Description)")
     if tx_sample:
         lines.append("Selected example transactions include:")
-        for tx in tx_sample:
-            lines.append(f"- {format_tx_for_sar(tx)}")
+        for line in tx_sample:
+            lines.append(f"- {line}")
     else:
         lines.append("- No transaction-level details are available.")
     lines.append("")
@@ -152,10 +378,8 @@ def _fallback_sar(transactions, patterns, risk_score=None, risk_band=None):
     # 4. Transaction Summary (Selected Examples)
     lines.append("4. Transaction Summary (Selected Examples)")
     if tx_sample:
-        for tx in tx_sample:
-            lines.append(
-                f"- {format_tx_for_sar(tx)}"
-            )
+        for line in tx_sample:
+            lines.append(f"- {line}")
     else:
         lines.append("- No transactions to summarize.")
     lines.append("")
@@ -176,24 +400,46 @@ def _fallback_sar(transactions, patterns, risk_score=None, risk_band=None):
     return "\n".join(lines)
 
 
-def generate_sar(transactions, patterns, risk_score=None, risk_band=None):
+class SarStreamError(Exception):
+    """Streaming SAR request failed; the caller falls back to generate_sar."""
+
+
+def _prepare_sar(transactions, patterns, risk_score, risk_band):
     """
-    Calls OpenRouter if possible; if key is missing or HTTP fails,
-    returns a deterministic fallback SAR narrative so the backend never breaks.
+    Shared front half of generate_sar/stream_sar. Returns (ready_text, request):
+    ready_text is set when no LLM call is needed (no key -> fallback, or a
+    cache hit); otherwise request carries what the call needs.
     """
+    fallback_txs = _fallback_sample(transactions)
+
     # If no key configured, immediately fallback
     if not OPENROUTER_KEY:
-        logging.warning("OPENROUTER_KEY not set, using fallback SAR")
-        return _fallback_sar(transactions, patterns, risk_score, risk_band)
-
-    tx_for_prompt = transactions[:100] if transactions else []
-    formatted_txs = [format_tx_for_sar(tx) for tx in tx_for_prompt]
-
-    prompt = SAR_PROMPT_TEMPLATE.format(
-        transactions="\n".join(formatted_txs),
-        patterns=json.dumps(patterns or [], indent=2),
-        risk_score=risk_score if risk_score is not None else "N/A",
-        risk_band=risk_band if risk_band is not None else "N/A",
+        logger.warning("OPENROUTER_KEY not set, using fallback SAR")
+        return _fallback_sar(fallback_txs, patterns, risk_score, risk_band), None
+
+    cache_key = _sar_cache_key(transactions, patterns, risk_score, risk_band)
+    cached = _sar_cache_get(cache_key)
+    if cached is not None:
+        logger.info("SAR narrative served from cache")
+        return cached, None
+
+    # Disk tier keyed on the normalized inputs rather than the raw prompt text:
+    # pattern evidence carries set-ordered lists, so the prompt itself varies
+    # between processes for the same file
+    prompt_cache_key = prompt_key(SAR_MODEL, cache_key)
+    cached = PROMPT_CACHE.get(prompt_cache_key)
+    if cached is not None:
+        logger.info("SAR narrative served from prompt cache")
+        _sar_cache_set(cache_key, cached)
+        return cached, None
+
+    # Highest-signal rows for the prompt, selected and formatted once
+    formatted_txs = format_txs_for_sar(select_txs_for_sar(transactions))
+    prompt = _build_sar_prompt(
+        "\n".join(formatted_txs),
+        orjson.dumps(patterns or []).decode(),
+        risk_score,
+        risk_band,
     )
 
     headers = {
@@ -202,27 +448,109 @@ def generate_sar(transactions, patterns, risk_score=None, risk_band=None):
     }
 
     body = {
-        "model": "google/gemini-2.0-flash-lite-preview-02-05:free",
+        "model": SAR_MODEL,
         "messages": [
             {"role": "user", "content": prompt}
         ],
         "max_tokens": 800,
     }
 
+    request = {
+        "fallback_txs": fallback_txs,
+        "cache_key": cache_key,
+        "prompt_cache_key": prompt_cache_key,
+        "headers": headers,
+        "body": body,
+    }
+    return None, request
+
+
+def _remember_sar(request, sar_text: str):
+    _sar_cache_set(request["cache_key"], sar_text)
+    PROMPT_CACHE.set(request["prompt_cache_key"], sar_text)
+
+
+async def generate_sar(transactions, patterns, risk_score=None, risk_band=None):
+    """
+    Calls OpenRouter if possible; if key is missing or HTTP fails,
+    returns a deterministic fallback SAR narrative so the backend never breaks.
+    """
+    ready_text, request = _prepare_sar(transactions, patterns, risk_score, risk_band)
+    if ready_text is not None:
+        return ready_text
+    fallback_txs = request["fallback_txs"]
+
     try:
-        logging.info("Sending request to OpenRouter for SAR generation (timeout=20s)")
-        resp = requests.post(OPENROUTER_URL, headers=headers, json=body, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-        logging.info("SAR generation successful")
-        return data["choices"][0]["message"]["content"]
-    except requests.Timeout:
-        logging.error("SAR generation timed out after 20s. Using fallback.")
-        return _fallback_sar(transactions, patterns, risk_score, risk_band)
-    except requests.RequestException as e:
+        logger.info("Sending request to OpenRouter for SAR generation (timeout=30s)")
+        status, raw = await _post_openrouter(request["headers"], request["body"], timeout=30)
+        if status >= 400:
+            logger.error("SAR generation failed: HTTP %s. Using fallback.", status)
+            return _fallback_sar(fallback_txs, patterns, risk_score, risk_band)
+        data = orjson.loads(raw)
+        logger.info("SAR generation successful")
+        sar_text = data["choices"][0]["message"]["content"]
+        _remember_sar(request, sar_text)
+        return sar_text
+    except asyncio.TimeoutError:
+        logger.error("SAR generation timed out after 30s. Using fallback.")
+        return _fallback_sar(fallback_txs, patterns, risk_score, risk_band)
+    except (aiohttp.ClientError, ValueError) as e:
         # On any network/auth/model error: do NOT kill the job
-        logging.error(f"SAR generation failed: {e}. Using fallback.")
-        return _fallback_sar(transactions, patterns, risk_score, risk_band)
+        logger.error("SAR generation failed: %s. Using fallback.", e)
+        return _fallback_sar(fallback_txs, patterns, risk_score, risk_band)
+
+
+async def stream_sar(transactions, patterns, risk_score=None, risk_band=None):
+    """
+    Async generator over the SAR narrative as OpenRouter streams it
+    (stream: true, server-sent events), so callers can surface text before
+    the completion finishes. Fallback and cached narratives come through as
+    a single chunk. Raises SarStreamError if the stream fails; callers then
+    use generate_sar, which retries and falls back.
+    """
+    ready_text, request = _prepare_sar(transactions, patterns, risk_score, risk_band)
+    if ready_text is not None:
+        yield ready_text
+        return
+
+    body = {**request["body"], "stream": True}
+    parts = []
+    try:
+        logger.info("Streaming SAR narrative from OpenRouter (timeout=30s)")
+        async with _OPENROUTER_LIMIT:
+            async with _get_session().post(
+                OPENROUTER_URL,
+                headers=request["headers"],
+                json=body,
+                timeout=aiohttp.ClientTimeout(
+                    total=30, connect=HTTP_CONNECT_TIMEOUT_SECONDS
+                ),
+            ) as resp:
+                if resp.status >= 400:
+                    raise SarStreamError(f"HTTP {resp.status}")
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b"[DONE]":
+                        break
+                    delta = orjson.loads(payload)["choices"][0]["delta"].get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+    except (asyncio.TimeoutError, aiohttp.ClientError, ValueError, KeyError, IndexError) as e:
+        raise SarStreamError(str(e) or type(e).__name__) from e
+
+    if not parts:
+        raise SarStreamError("empty stream")
+    logger.info("SAR streaming successful")
+    _remember_sar(request, "".join(parts))
+
+
+async def collect(chunks) -> str:
+    """Joins an async stream of text chunks, e.g. stream_sar, into one string."""
+    return "".join([chunk async for chunk in chunks])
 
 
 LOCATION_PROMPT_TEMPLATE = """
@@ -245,94 +573,139 @@ DESCRIPTIONS:
 {descriptions}
 """
 
-def enrich_locations(transactions):
+LOCATION_MODEL = "arcee-ai/trinity-large-preview:free"
+
+# Descriptions per location prompt, and how many batches may be in flight
+LOCATION_BATCH_SIZE = 10
+LOCATION_BATCH_CONCURRENCY = 8
+# ~60 tokens per location object, with headroom; JSON mode keeps output bare
+LOCATION_MAX_TOKENS = 2000
+
+
+def _write_debug_file(name: str, text: str):
+    with open(name, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+async def _locate_batch(details, headers, limit: asyncio.Semaphore) -> dict:
+    """
+    Sends one batch of descriptions to the location model (JSON mode) and
+    returns the parsed {description: location} map. Raises on HTTP or
+    parse failure, which enrich_locations counts as a failed batch.
+    """
+    prompt = LOCATION_PROMPT_TEMPLATE.format(
+        descriptions=orjson.dumps(details, option=orjson.OPT_INDENT_2).decode()
+    )
+
+    body = {
+        "model": LOCATION_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": LOCATION_MAX_TOKENS,
+        "response_format": {"type": "json_object"},
+    }
+
+    raw_content = None
+    prompt_cache_key = prompt_key(body["model"], prompt)
+    content = PROMPT_CACHE.get(prompt_cache_key)
+    if content is not None:
+        logger.info("Location response served from prompt cache")
+    else:
+        async with limit:
+            status, raw = await _post_openrouter(headers, body, timeout=45)
+
+        if status >= 400:
+            error_details = raw.decode("utf-8", errors="replace")
+            logger.error("LLM API Error: %s - %s", status, error_details)
+            raise Exception(f"API Error {status}: {error_details}")
+
+        content = orjson.loads(raw)["choices"][0]["message"]["content"]
+        raw_content = content
+
+    # Raw response dump, opt-in and off the event loop
+    if LOCATION_DEBUG:
+        await asyncio.to_thread(_write_debug_file, "location_debug_raw.log", content)
+
+    # JSON mode: the content is the object itself, no fences or <think> blocks
+    location_map = orjson.loads(content)
+    if raw_content is not None:
+        PROMPT_CACHE.set(prompt_cache_key, raw_content)
+    return location_map
+
+
+async def enrich_locations(transactions):
     """
     Extracts location data from transaction details using LLM.
+    Descriptions are sent in batches of LOCATION_BATCH_SIZE, concurrently,
+    so every unique description is covered without one oversized prompt.
     Returns:
       1. Enriched transactions (list)
       2. Location summary (string)
     """
     if not OPENROUTER_KEY or not transactions:
-        print("Skipping location enrichment: No API key or transactions")
-        logging.warning("Skipping location enrichment: No API key or transactions")
+        logger.warning("Skipping location enrichment: No API key or transactions")
         return transactions, "Location analysis unavailable (LLM key missing)."
 
     # 1. Deduplicate descriptions to save tokens
-    unique_details = list({tx.get("Details", "").strip() for tx in transactions if tx.get("Details")})
+    # Sorted so the same file always yields the same prompts (and cache keys)
+    unique_details = sorted({tx.get("Details", "").strip() for tx in transactions if tx.get("Details")})
     # Filter out empty or very short descriptions
-    unique_details = [d for d in unique_details if len(d) > 3][:30] # Limit to 30 unique descriptions to prevent truncation
+    unique_details = [d for d in unique_details if len(d) > 3]
 
     if not unique_details:
-        logging.info("No unique details found for location enrichment")
+        logger.info("No unique details found for location enrichment")
         return transactions, "No identifiable locations found."
 
-    # 2. Call LLM
-    prompt = LOCATION_PROMPT_TEMPLATE.format(descriptions=json.dumps(unique_details, indent=2))
-    
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_KEY}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "http://localhost:3000",
-        "X-Title": "AML Case Processor",
-    }
-    
-    body = {
-        "model": "arcee-ai/trinity-large-preview:free", 
-        "messages": [{"role": "user", "content": prompt}],
-        "max_tokens": 10000,
-#        "response_format": {"type": "json_object"}
-    }
-    
-    location_map = {}
-    try:
-        print(f"Sending {len(unique_details)} descriptions for location enrichment...")
-        logging.info(f"Sending {len(unique_details)} descriptions for location enrichment...")
-        resp = requests.post(OPENROUTER_URL, headers=headers, json=body, timeout=45)
-        
-        if not resp.ok:
-            error_details = resp.text
-            print(f"LLM API Error: {resp.status_code} - {error_details}")
-            logging.error(f"LLM API Error: {resp.status_code} - {error_details}")
-            raise Exception(f"API Error {resp.status_code}: {error_details}")
+    # 2. Reuse locations already resolved by earlier jobs
+    location_map = LOCATION_CACHE.get_many(unique_details)
+    unknowns = [d for d in unique_details if d not in location_map]
+    logger.info("Location cache: %d hits, %d to look up", len(location_map), len(unknowns))
+
+    # 3. Call LLM for the rest, one prompt per batch
+    if unknowns:
+        headers = {
+            "Authorization": f"Bearer {OPENROUTER_KEY}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "http://localhost:3000",
+            "X-Title": "AML Case Processor",
+        }
+
+        batches = [
+            unknowns[i:i + LOCATION_BATCH_SIZE]
+            for i in range(0, len(unknowns), LOCATION_BATCH_SIZE)
+        ]
+        limit = asyncio.Semaphore(LOCATION_BATCH_CONCURRENCY)
+
+        logger.info(
+            "Sending %d descriptions in %d batches for location enrichment...",
+            len(unknowns), len(batches),
+        )
+        results = await asyncio.gather(
+            *(_locate_batch(batch, headers, limit) for batch in batches),
+            return_exceptions=True,
+        )
 
-        content = resp.json()["choices"][0]["message"]["content"]
-        
-        # Parse potential JSON response (handling markdown fences if model adds them)
-        # Robust JSON extraction
-        import re
-        
-        # Log raw response for debugging
-        with open("location_debug_raw.log", "w", encoding="utf-8") as f:
-            f.write(content)
+        fetched = {}
+        errors = []
+        for result in results:
+            if isinstance(result, Exception):
+                errors.append(result)
+            elif isinstance(result, dict):
+                fetched.update(result)
+        LOCATION_CACHE.set_many(fetched)
+        location_map.update(fetched)
+
+        if errors:
+            e = errors[0]
+            logger.error(
+                "Location enrichment failed for %d/%d batches",
+                len(errors), len(batches), exc_info=e,
+            )
+            if len(errors) == len(batches) and not location_map:
+                return transactions, "Location analysis failed due to service error."
 
-        # 1. Remove <think> tags if present
-        content = re.sub(r'<think>.*?</think>', '', content, flags=re.DOTALL)
-        
-        # 2. Extract JSON block using regex (finding the outer-most braces)
-        json_match = re.search(r'(\{.*\})', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(1)
-        
-        # 3. Cleanup common markdown artifacts just in case
-        content = content.replace("```json", "").replace("```", "").strip()
-        
-        if not content:
-            raise ValueError("LLM returned empty content after cleanup")
-            
-        location_map = json.loads(content)
-        print(f"Location enrichment successful. Mapped {len(location_map)} locations.")
-        logging.info(f"Location enrichment successful. Mapped {len(location_map)} locations.")
-        
-    except Exception as e:
-        import traceback
-        with open("location_error.log", "w") as f:
-            f.write(f"Error: {str(e)}\n\nTraceback:\n{traceback.format_exc()}")
-            
-        print(f"Location enrichment failed: {e}")
-        logging.error(f"Location enrichment failed: {e}")
-        return transactions, "Location analysis failed due to service error."
+    logger.info("Location enrichment successful. Mapped %d locations.", len(location_map))
 
-    # 3. Merge back into transactions
+    # 4. Merge back into transactions
     enriched_txs = []
     countries = set()
     cities = set()
@@ -354,7 +727,7 @@ def enrich_locations(transactions):
         
         enriched_txs.append(new_tx)
 
-    # 4. Generate Summary
+    # 5. Generate Summary
     if not countries:
         summary = "No geographic data extracted from descriptions."
     else:
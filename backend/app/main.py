@@ -1,14 +1,24 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.responses import ORJSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import shutil
+import orjson
 import uuid
-from .jobs import process_uploaded_file, JOB_STORE
+from .jobs import job_worker, load_transactions, shutdown_pools, JOB_STORE, JOB_QUEUE_MAXSIZE, JOB_WORKERS
+from .llm_client import open_session, close_session
+from .job_store import JobQueue, REDIS_URL
 from pathlib import Path
 from dotenv import load_dotenv
 
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
 load_dotenv()
 
-app = FastAPI(title="AML Case Processor")
+app = FastAPI(title="AML Case Processor", default_response_class=ORJSONResponse)
 
 # CORS so Next.js frontend can call this API
 origins = [
@@ -28,64 +38,205 @@ app.add_middleware(
 BASE_DIR = Path(__file__).resolve().parent.parent  # backend/
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)  # create folder if it doesn't exist
+UPLOAD_CHUNK_BYTES = 1 << 20
+
 
-@app.post("/api/upload")
-async def upload(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
+def _save_upload(src, file_path: Path):
+    # Chunked copy: peak memory stays ~1MB regardless of upload size
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(src, f, length=UPLOAD_CHUNK_BYTES)
+
+@app.on_event("startup")
+async def startup():
+    app.state.http = await open_session()
+    app.state.job_queue = JobQueue(REDIS_URL, maxsize=JOB_QUEUE_MAXSIZE)
+    app.state.job_workers = [
+        asyncio.create_task(job_worker(app.state.job_queue))
+        for _ in range(JOB_WORKERS)
+    ]
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in app.state.job_workers:
+        task.cancel()
+    await asyncio.gather(*app.state.job_workers, return_exceptions=True)
+    await close_session()
+    shutdown_pools()
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.post("/api/upload", status_code=202)
+async def upload(file: UploadFile = File(...)):
     job_id = str(uuid.uuid4())
 
     # build a path like: backend/uploads/<job_id>_filename.ext
     file_path = UPLOAD_DIR / f"{job_id}_{file.filename}"
 
-    contents = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    await asyncio.to_thread(_save_upload, file.file, file_path)
 
-    JOB_STORE[job_id] = {
-        "status": "queued",
-        "file": str(file_path),
-    }
+    await JOB_STORE.update(job_id, status="queued", file=str(file_path))
 
-    if background_tasks is not None:
-        background_tasks.add_task(process_uploaded_file, job_id)
-    else:
-        # synchronous for debugging
-        process_uploaded_file(job_id)
+    await app.state.job_queue.put(job_id)
 
     return {"job_id": job_id}
 
+# Bookkeeping in a stored result (the server-side JSONL path and its
+# preview); clients get a plain "transactions" list instead
+_INTERNAL_RESULT_KEYS = ("transactions_ref", "transactions_preview")
+
+
+def _public_result(result, transactions):
+    public = {k: v for k, v in result.items() if k not in _INTERNAL_RESULT_KEYS}
+    public["transactions"] = transactions
+    return public
+
+
+def _public_job(job):
+    result = job.get("result")
+    if result is None:
+        return job
+    return {**job, "result": _public_result(result, result.get("transactions_preview", []))}
+
+
 @app.get("/api/status/{job_id}")
-def status(job_id: str):
-    return JOB_STORE.get(job_id, {"error":"not_found"})
+async def status(job_id: str):
+    job = await JOB_STORE.get(job_id)
+    return _public_job(job) if job is not None else {"error":"not_found"}
+
+@app.head("/api/status/{job_id}")
+async def status_head(job_id: str):
+    # Pollers only need the state: X-Job-Status, no body to encode or parse
+    job = await JOB_STORE.get(job_id)
+    if job is None:
+        return Response(status_code=404)
+    return Response(headers={"X-Job-Status": str(job.get("status", ""))})
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
 
 @app.get("/api/result/{job_id}")
-def result(job_id: str):
-    job = JOB_STORE.get(job_id)
+async def result(job_id: str, request: Request):
+    job = await JOB_STORE.get(job_id)
     if not job:
-        return JSONResponse({"error":"not_found"}, status_code=404)
-    return job.get("result", {"status": job.get("status")})
+        return ORJSONResponse({"error":"not_found"}, status_code=404)
+    result = job.get("result")
+    if result is None:
+        return {"status": job.get("status")}
+
+    # Transactions are served from the job's JSONL file, not held in the store
+    tx_ref = result.get("transactions_ref")
+    if tx_ref and Path(tx_ref).exists():
+        transactions = await asyncio.to_thread(load_transactions, tx_ref)
+    else:
+        transactions = result.get("transactions_preview", [])
+    result = _public_result(result, transactions)
+
+    # Binary body for clients that ask for it (smaller, cheaper to decode);
+    # JSON otherwise, or when ormsgpack isn't installed
+    if ormsgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(
+            ormsgpack.packb(result, option=ormsgpack.OPT_NON_STR_KEYS),
+            media_type=MSGPACK_MEDIA_TYPE,
+            headers={"Vary": "Accept"},
+        )
+    return ORJSONResponse(result, headers={"Vary": "Accept"})
+
+SAR_STREAM_POLL_SECONDS = 0.25
+
+
+def _sse(payload, event: str = None) -> bytes:
+    head = f"event: {event}\n".encode() if event else b""
+    return head + b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def _sar_events(job_id: str):
+    sent = ""
+    while True:
+        job = await JOB_STORE.get(job_id)
+        if job is None:
+            yield _sse({"error": "not_found"}, event="error")
+            return
+        job_status = job.get("status")
+        if job_status == "error":
+            yield _sse({"error": job.get("error")}, event="error")
+            return
+        result = job.get("result")
+        text = result.get("sar_text", "") if result else job.get("sar_partial", "")
+        if text != sent:
+            if text.startswith(sent):
+                yield _sse({"delta": text[len(sent):]})
+            else:
+                yield _sse({"text": text}, event="reset")
+            sent = text
+        if job_status == "done":
+            yield _sse({"status": "done"}, event="done")
+            return
+        await asyncio.sleep(SAR_STREAM_POLL_SECONDS)
+
+
+@app.get("/api/sar/{job_id}/stream")
+async def sar_stream(job_id: str):
+    """SAR narrative as server-sent events while the job is still generating it."""
+    return StreamingResponse(
+        _sar_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+STATUS_STREAM_POLL_SECONDS = 0.1
+
+
+async def _status_events(job_id: str):
+    # One event per status transition, carrying the same job payload as
+    # /api/status; ends once the job is done or failed
+    last = None
+    while True:
+        job = await JOB_STORE.get(job_id)
+        if job is None:
+            yield _sse({"error": "not_found"}, event="error")
+            return
+        job_status = job.get("status")
+        if job_status != last:
+            yield _sse(_public_job(job))
+            last = job_status
+        if job_status in ("done", "error"):
+            return
+        await asyncio.sleep(STATUS_STREAM_POLL_SECONDS)
+
+
+@app.get("/api/status/stream/{job_id}")
+async def status_stream(job_id: str):
+    """Job status as server-sent events, so clients don't have to poll."""
+    return StreamingResponse(
+        _status_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 @app.get("/api/download/{job_id}")
-def download(job_id: str):
-    job = JOB_STORE.get(job_id)
+async def download(job_id: str):
+    job = await JOB_STORE.get(job_id)
     if not job:
-        return JSONResponse({"error":"not_found"}, status_code=404)
+        return ORJSONResponse({"error":"not_found"}, status_code=404)
     pdf_path = job.get("pdf")
     if not pdf_path:
-        return JSONResponse({"error":"no_pdf"}, status_code=400)
+        return ORJSONResponse({"error":"no_pdf"}, status_code=400)
     return FileResponse(pdf_path, media_type="application/pdf", filename=f"sar_{job_id}.pdf")
 
 @app.get("/api/audio/{job_id}")
-def get_audio(job_id: str):
-    job = JOB_STORE.get(job_id)
+async def get_audio(job_id: str):
+    job = await JOB_STORE.get(job_id)
     if not job:
-        return JSONResponse({"error":"not_found"}, status_code=404)
+        return ORJSONResponse({"error":"not_found"}, status_code=404)
     
     audio_path = job.get("audio")
     if not audio_path:
-        return JSONResponse({"error":"no_audio"}, status_code=400)
+        return ORJSONResponse({"error":"no_audio"}, status_code=400)
     
     path_obj = Path(audio_path)
     if not path_obj.exists():
-         return JSONResponse({"error":"file_missing"}, status_code=404)
+         return ORJSONResponse({"error":"file_missing"}, status_code=404)
 
     return FileResponse(path_obj, media_type="audio/mpeg", filename=f"sar_{job_id}.mp3")
@@ -1,16 +1,86 @@
 # app/parser.py
 
 from pathlib import Path
+from datetime import date, datetime
+import os
 import csv
+import hashlib
+import pickle
 import pdfplumber
 import re
 
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
 DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
 KNOWN_CHANNELS = {
     "ach", "wire", "cash", "atm", "card", "p2p", "crypto", "check"
 }
 
-def extract_transactions(file_path: str):
+# PDF line scanning, compiled once at import instead of per call
+# Amounts with dollar signs (including negative balances)
+MONEY_WITH_DOLLAR_RE = re.compile(r"\$-?[\d,]+(?:\.\d{2})?")
+MONEY_WITHOUT_DOLLAR_RE = re.compile(r"(?<!\$)\b(\d{1,3}(?:,?\d{3})*(?:\.\d{2})?)\b")
+PDF_NOISE_MARKERS = (
+    "opening balance", "closing balance", "statement period",
+    "date amount type", "date description channel", "debit credit balance",
+)
+# Every noise marker contains "balance", "statement period" or "date ", so
+# rows with none of those (nearly all of them) skip the full marker scan.
+# Spelled out as an `or` chain in _parse_pdf_text; any() costs 3x as much
+
+
+def _money_value(amount: str) -> float:
+    # Chained replace beats str.translate (~3x) on strings this short
+    return float(amount.replace("$", "").replace(",", ""))
+
+
+def _last_channel(tokens) -> str:
+    """Last known channel among already-lowercased tokens, else "unknown"."""
+    for t in reversed(tokens):
+        if t in KNOWN_CHANNELS:
+            return t
+    return "unknown"
+
+
+def _tokens_before(tokens, word: str) -> str:
+    """Joins the tokens preceding the first `word` (all of them if absent)."""
+    return " ".join(tokens[:tokens.index(word)] if word in tokens else tokens)
+
+
+# Statements at least this long are parsed page-parallel
+PDF_PARALLEL_MIN_PAGES = 8
+# Contiguous pages handed to each worker task, so a worker opens the file
+# once per run instead of once per page
+PDF_PAGES_PER_TASK = 4
+
+# Text extraction engine. PyMuPDF is roughly 10x faster than pdfplumber for
+# plain text; PDF_ENGINE=pdfplumber forces the old path, and pdfplumber is
+# also used whenever PyMuPDF is missing or can't open the file
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pymupdf").strip().lower()
+# Words whose baselines are this close (in points) share a line, as in pdfplumber
+PDF_LINE_TOLERANCE = 3
+
+# Parsed statements keyed by a digest of the file's bytes, so a re-upload of
+# the same statement (saved under a new job_id name) skips extraction.
+# Pickles on disk are shared by every worker process; only the
+# PDF_CACHE_MAX_FILES most recently used are kept. Bump PDF_CACHE_VERSION
+# whenever the parser's output changes
+PDF_CACHE_DIR = Path(os.getenv(
+    "PDF_CACHE_DIR",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "pdf"),
+))
+PDF_CACHE_VERSION = 2
+PDF_CACHE_MAX_FILES = int(os.getenv("PDF_CACHE_MAX_FILES", "256"))
+PDF_DIGEST_CHUNK_BYTES = 1 << 20
+
+def extract_transactions(file_path: str, pool=None):
+    """
+    `pool` (an executor) is only used for PDFs: their pages are parsed there
+    in runs instead of in the calling process.
+    """
     path = Path(file_path)
     ext = path.suffix.lower()
 
@@ -19,254 +89,452 @@ def extract_transactions(file_path: str):
     elif ext in [".xlsx", ".xls"]:
         return _extract_from_excel(path)
     elif ext == ".pdf":
-        return _extract_from_pdf(path)
+        return _extract_from_pdf_cached(path, pool)
     else:
         return []
 
 
+def _shared_values():
+    """
+    Returns a setdefault that maps equal values onto a single object, for
+    the low-cardinality columns. Fewer distinct strings per statement means
+    less memory per row, and pickle (how rows come back from the CPU
+    pool) writes each shared object once.
+    """
+    return {}.setdefault
+
+
 def _extract_from_csv(path: Path):
     txs = []
+    # Dates, channels and directions repeat row after row; keep one str
+    # object per distinct value (see _shared_values)
+    share = _shared_values()
     with path.open("r", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return txs
+
+        # Resolve header positions once. A repeated header maps to its last
+        # column, and a missing one to a trailing None slot, so lookups read
+        # exactly like DictReader's row.get()
+        width = len(header)
+        position = {name: i for i, name in enumerate(header)}
+        date_a, date_b = position.get("Date", width), position.get("date", width)
+        amt_a, amt_b = position.get("amount", width), position.get("Amount", width)
+        type_a, type_b = position.get("Type", width), position.get("type", width)
+        det_a, det_b = position.get("Details", width), position.get("description", width)
+        dir_a, dir_b = position.get("Direction", width), position.get("direction", width)
+        pad = [None] * (width + 1)
+
         for row in reader:
+            if not row:
+                continue
+            if len(row) != width:
+                row = (row + pad)[:width]
+            row.append(None)
+            d = row[date_a] or row[date_b]
+            ttype = row[type_a] or row[type_b]
+            direction = row[dir_a] or row[dir_b] or "unknown"
             txs.append({
-                "Date": row.get("Date") or row.get("date"),
-                "amount": row.get("amount") or row.get("Amount"),
-                "Type": row.get("Type") or row.get("type"),
-                "Details": row.get("Details") or row.get("description") or "",
-                "direction": row.get("Direction") or row.get("direction") or "unknown",
+                "Date": share(d, d),
+                "amount": row[amt_a] or row[amt_b],
+                "Type": share(ttype, ttype),
+                "Details": row[det_a] or row[det_b] or "",
+                "direction": share(direction, direction),
             })
     return txs
 
 
+def _excel_rows(path: Path):
+    """
+    Yields sheet rows as value tuples, header first. Uses the Rust-backed
+    python-calamine reader when installed, normalizing its cells to what
+    openpyxl returns (None for blanks, int for whole numbers, datetime for
+    dates); otherwise falls back to openpyxl.
+    """
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        import openpyxl
+        # Single sequential pass, so stream the sheet instead of loading it whole
+        wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
+        try:
+            yield from wb.active.iter_rows(values_only=True)
+        finally:
+            wb.close()
+        return
+
+    sheet = CalamineWorkbook.from_path(str(path)).get_sheet_by_index(0)
+    for row in sheet.to_python(skip_empty_area=False):
+        yield tuple(_calamine_cell(v) for v in row)
+
+
+def _calamine_cell(value):
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
 def _extract_from_excel(path: Path):
-    import openpyxl
-    wb = openpyxl.load_workbook(path, data_only=True)
-    ws = wb.active
+    rows = _excel_rows(path)
+    header_row = next(rows, None)
+    if header_row is None:
+        return []
 
-    headers = [str(c.value).strip() if c.value else "" for c in ws[1]]
+    headers = [str(v).strip() if v else "" for v in header_row]
     txs = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        row_dict = {headers[i]: row[i] for i in range(len(headers))}
+    share = _shared_values()
+    for row in rows:
+        row_dict = {headers[i]: row[i] if i < len(row) else None for i in range(len(headers))}
+        d = row_dict.get("Date") or row_dict.get("date")
+        ttype = row_dict.get("Type") or row_dict.get("type")
+        direction = row_dict.get("Direction") or row_dict.get("direction") or "unknown"
         txs.append({
-            "Date": row_dict.get("Date") or row_dict.get("date"),
+            "Date": share(d, d),
             "amount": row_dict.get("amount") or row_dict.get("Amount"),
-            "Type": row_dict.get("Type") or row_dict.get("type"),
+            "Type": share(ttype, ttype),
             "Details": row_dict.get("Details") or row_dict.get("description") or "",
-            "direction": row_dict.get("Direction") or row_dict.get("direction") or "unknown",
+            "direction": share(direction, direction),
         })
     return txs
 
 
+# Direction keywords as one substring alternation each, scanned in a single pass
+INBOUND_KEYWORDS = (
+    "incoming", "from ", "credit", "deposit", "salary", "payroll", "received"
+)
+OUTBOUND_KEYWORDS = (
+    "transfer to", "wire to", "withdrawal", "payment", "sent", "debit", "purchase"
+)
+INBOUND_RE = re.compile("|".join(map(re.escape, INBOUND_KEYWORDS)))
+OUTBOUND_RE = re.compile("|".join(map(re.escape, OUTBOUND_KEYWORDS)))
+
+
 def infer_direction_from_details(details: str) -> str:
     d = details.lower()
 
-    inbound = (
-        "incoming", "from ", "credit", "deposit", "salary", "payroll", "received"
-    )
-    outbound = (
-        "transfer to", "wire to", "withdrawal", "payment", "sent", "debit", "purchase"
-    )
-
-    if any(k in d for k in inbound):
+    if INBOUND_RE.search(d):
         return "inbound"
-    if any(k in d for k in outbound):
+    if OUTBOUND_RE.search(d):
         return "outbound"
 
     return "unknown"
 
 
-def _extract_from_pdf(path: Path):
+def _pymupdf_page_text(page) -> str:
+    """
+    Page text with one line per visual row, the way pdfplumber's
+    extract_text() lays it out. PyMuPDF's own "text" mode emits each table
+    cell on its own line, so words are regrouped by baseline instead.
+
+    Rows that mix font sizes put their words' bottoms a few points apart,
+    so words are clustered into lines first (each within PDF_LINE_TOLERANCE
+    of the previous bottom, as pdfplumber clusters) and only then ordered
+    left to right.
+    """
+    rows = []
+    last_bottom = None
+    for word in sorted(page.get_text("words"), key=lambda w: w[3]):
+        if last_bottom is None or word[3] - last_bottom > PDF_LINE_TOLERANCE:
+            rows.append([])
+        rows[-1].append(word)
+        last_bottom = word[3]
+    return "\n".join(
+        " ".join(w[4] for w in sorted(row, key=lambda w: w[0])) for row in rows
+    )
+
+
+def _iter_pdf_page_texts(path: str, page_indexes=None):
+    """
+    Yields the text of every page (or just `page_indexes`), in page order,
+    one page at a time so a long statement's text is never held all at once.
+    If PyMuPDF fails partway, pdfplumber picks up from the page it stopped on.
+    """
+    done = 0
+    if pymupdf is not None and PDF_ENGINE == "pymupdf":
+        try:
+            with pymupdf.open(path) as doc:
+                for i in range(doc.page_count) if page_indexes is None else page_indexes:
+                    text = _pymupdf_page_text(doc.load_page(i))
+                    done += 1
+                    yield text
+            return
+        except RuntimeError:
+            # Malformed for MuPDF (FileDataError); pdfplumber may still read it
+            pass
+
+    with pdfplumber.open(path) as pdf:
+        indexes = range(len(pdf.pages)) if page_indexes is None else page_indexes
+        for i in list(indexes)[done:]:
+            page = pdf.pages[i]
+            yield page.extract_text() or ""
+            # Drop the page's parsed layout objects once its text is out
+            page.close()
+
+
+def _pdf_page_count(path: str) -> int:
+    if pymupdf is not None and PDF_ENGINE == "pymupdf":
+        try:
+            with pymupdf.open(path) as doc:
+                return doc.page_count
+        except RuntimeError:
+            pass
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _pdf_cache_file(path: Path) -> Path:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(PDF_DIGEST_CHUNK_BYTES):
+            h.update(chunk)
+    h.update(f"|{PDF_ENGINE}|{PDF_CACHE_VERSION}".encode())
+    return PDF_CACHE_DIR / f"{h.hexdigest()}.pkl"
+
+
+def _extract_from_pdf_cached(path: Path, pool=None):
+    cache_file = _pdf_cache_file(path)
+    try:
+        with open(cache_file, "rb") as f:
+            txs = pickle.load(f)
+        # mtime doubles as last-used time for eviction
+        os.utime(cache_file)
+        return txs
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    txs = _extract_from_pdf(path, pool)
+    try:
+        PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(txs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+        _prune_pdf_cache()
+    except OSError:
+        pass
+    return txs
+
+
+def _prune_pdf_cache():
+    """Drops the least recently used pickles beyond PDF_CACHE_MAX_FILES."""
+    entries = []
+    for f in PDF_CACHE_DIR.glob("*.pkl"):
+        try:
+            entries.append((f.stat().st_mtime, f))
+        except FileNotFoundError:
+            pass  # pruned by another worker
+    if len(entries) <= PDF_CACHE_MAX_FILES:
+        return
+    entries.sort()
+    for _, f in entries[:len(entries) - PDF_CACHE_MAX_FILES]:
+        f.unlink(missing_ok=True)
+
+
+def _extract_from_pdf(path: Path, pool=None):
     """
     Handles three PDF formats:
     1. Complex_AML_Case: "Date Amount Type Direction Details" (1 amt with $, explicit direction)
     2. Mixed_200_Cases: "Date Description Channel Debit Credit" (no $, 2 amt columns)
     3. Upgraded_Business/Personal: "Date Description Channel Debit Credit Balance" (with $, 3 amt columns)
+
+    With a `pool` (the job pipeline's _CPU_POOL), the pages go there: long
+    statements in runs of PDF_PAGES_PER_TASK pages, short ones as a single
+    task. PDF pages aren't picklable, so each task reopens the file once
+    and extracts its own run, keeping text extraction (the expensive part)
+    parallel too. Pages are merged back in order. Without one, pages are
+    parsed here in sequence.
     """
+    if pool is None:
+        txs = []
+        for text in _iter_pdf_page_texts(str(path)):
+            txs.extend(_parse_pdf_text(text))
+        return txs
+
+    page_count = _pdf_page_count(str(path))
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        return pool.submit(_parse_pdf_pages, str(path), 0, page_count).result()
+
+    starts = range(0, page_count, PDF_PAGES_PER_TASK)
+    stops = [min(start + PDF_PAGES_PER_TASK, page_count) for start in starts]
+    runs = pool.map(_parse_pdf_pages, [str(path)] * len(starts), starts, stops)
+    return [tx for run_txs in runs for tx in run_txs]
+
+
+def _parse_pdf_pages(path: str, start: int, stop: int):
     txs = []
-    
-    # Regex for amounts with dollar signs (including negative balances)
-    money_with_dollar = re.compile(r"\$-?[\d,]+(?:\.\d{2})?")
-    money_without_dollar = re.compile(r"(?<!\$)\b(\d{1,3}(?:,?\d{3})*(?:\.\d{2})?)\b")
+    for text in _iter_pdf_page_texts(path, range(start, stop)):
+        txs.extend(_parse_pdf_text(text))
+    return txs
 
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ""
+
+def _parse_pdf_text(text: str):
+    txs = []
+    share = _shared_values()
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        # Skip headers and noise. match() is anchored and DATE_RE is exactly
+        # ten characters, so there's no need to slice the prefix off first
+        if not line or not DATE_RE.match(line):
+            continue
+        line_lower = line.lower()
+        if (
+            "balance" in line_lower or "statement period" in line_lower or "date " in line_lower
+        ) and any(x in line_lower for x in PDF_NOISE_MARKERS):
+            continue
+
+        date_str = line[:10]
+        remaining = line[10:].strip()
+        # The date prefix is digits and dashes, so slicing the already
+        # lowercased line gives the same text as lowercasing `remaining`
+        remaining_lower = line_lower[10:].strip()
+        
+        # Try extracting dollar amounts
+        amounts = MONEY_WITH_DOLLAR_RE.findall(remaining)
+        has_dollar = len(amounts) > 0
+        
+        # If no dollar signs, try without
+        if not has_dollar:
+            tokens = remaining.split()
+            amounts = [t for t in tokens if MONEY_WITHOUT_DOLLAR_RE.match(t)]
+        
+        if not amounts:
+            continue
+
+        transaction_amount = None
+        direction = "unknown"
+        channel = "unknown"
+        description = ""
+
+        # Check if this is Complex_AML_Case format (has explicit direction keyword)
+        has_explicit_direction = "inbound" in remaining_lower or "outbound" in remaining_lower
+
+        if has_explicit_direction:
+            # FORMAT 1: Complex_AML_Case (Date Amount Type Direction Details)
+            transaction_amount = amounts[0]
+            
+            if "inbound" in remaining_lower:
+                direction = "inbound"
+            elif "outbound" in remaining_lower:
+                direction = "outbound"
             
-            for line in text.splitlines():
-                line = line.strip()
-
-                # Skip headers and noise
-                if not line or not DATE_RE.match(line[:10]):
-                    continue
-                if any(x in line.lower() for x in [
-                    "opening balance", "closing balance", "statement period", 
-                    "date amount type", "date description channel", "debit credit balance"
-                ]):
-                    continue
-
-                date_str = line[:10]
-                remaining = line[10:].strip()
+            # Extract channel and description
+            tokens = remaining_lower.split()
+            for i, t in enumerate(tokens):
+                if t in KNOWN_CHANNELS:
+                    channel = t
+                    # Find direction keyword position
+                    dir_idx = -1
+                    for j in range(i+1, len(tokens)):
+                        if tokens[j] in ("inbound", "outbound"):
+                            dir_idx = j
+                            break
+                    if dir_idx > 0 and dir_idx < len(tokens) - 1:
+                        description = " ".join(tokens[dir_idx+1:])
+                    break
+        
+        elif has_dollar and len(amounts) >= 2:
+            # CRITICAL: Identify which amounts are Debit/Credit vs Balance
+            # Strategy: Balance is typically the LAST amount and often much larger or negative
+            # The transaction amount is one of the first 1-2 amounts
+            
+            if len(amounts) == 2:
+                # FORMAT: Could be Debit+Credit OR Amount+Balance
+                # Heuristic: if second is much larger or negative, it's balance
+                first_val = _money_value(amounts[0])
+                second_val = _money_value(amounts[1])
                 
-                # Try extracting dollar amounts
-                amounts = money_with_dollar.findall(remaining)
-                has_dollar = len(amounts) > 0
+                # If second is negative or 3x+ larger, it's likely the balance
+                if second_val < 0 or abs(second_val) > abs(first_val) * 3:
+                    transaction_amount = amounts[0]
+                    # Direction based on context since we don't have both debit/credit
+                    direction = "outbound" if first_val > 0 else "inbound"
+                else:
+                    # Both are transaction amounts (debit and credit columns)
+                    # Pick non-zero one
+                    if first_val > 0:
+                        transaction_amount = amounts[0]
+                        direction = "outbound"
+                    elif second_val > 0:
+                        transaction_amount = amounts[1]
+                        direction = "inbound"
+            
+            elif len(amounts) == 3:
+                # FORMAT: Debit, Credit, Balance
+                # Last one is balance, first two are debit/credit
+                debit_str = amounts[0]
+                credit_str = amounts[1]
+                balance_str = amounts[2]  # Ignore this
                 
-                # If no dollar signs, try without
-                if not has_dollar:
-                    tokens = remaining.split()
-                    amounts = [t for t in tokens if money_without_dollar.match(t)]
+                debit_val = _money_value(debit_str)
+                credit_val = _money_value(credit_str)
                 
-                if not amounts:
-                    continue
+                # Credit (inbound) takes precedence
+                if credit_val > 0:
+                    transaction_amount = credit_str
+                    direction = "inbound"
+                elif debit_val > 0:
+                    transaction_amount = debit_str
+                    direction = "outbound"
+            
+            # Extract channel and description - BEFORE the amounts
+            # Remove all amounts from the line first (amounts have no letters,
+            # so stripping them from the lowercased text is equivalent)
+            clean = remaining_lower
+            for a in amounts:
+                clean = clean.replace(a, "", 1)  # Remove first occurrence
+            
+            tokens = clean.split()
 
-                transaction_amount = None
-                direction = "unknown"
-                channel = "unknown"
-                description = ""
+            # Channel is typically the last meaningful token before amounts
+            channel = _last_channel(tokens)
 
-                # Check if this is Complex_AML_Case format (has explicit direction keyword)
-                has_explicit_direction = "inbound" in remaining.lower() or "outbound" in remaining.lower()
+            # Description is everything before channel
+            description = _tokens_before(tokens, channel)
 
-                if has_explicit_direction:
-                    # FORMAT 1: Complex_AML_Case (Date Amount Type Direction Details)
-                    transaction_amount = amounts[0]
-                    
-                    if "inbound" in remaining.lower():
-                        direction = "inbound"
-                    elif "outbound" in remaining.lower():
-                        direction = "outbound"
-                    
-                    # Extract channel and description
-                    tokens = remaining.split()
-                    for i, t in enumerate(tokens):
-                        if t.lower() in KNOWN_CHANNELS:
-                            channel = t.lower()
-                            # Find direction keyword position
-                            dir_idx = -1
-                            for j in range(i+1, len(tokens)):
-                                if tokens[j].lower() in ["inbound", "outbound"]:
-                                    dir_idx = j
-                                    break
-                            if dir_idx > 0 and dir_idx < len(tokens) - 1:
-                                description = " ".join(tokens[dir_idx+1:]).lower()
-                            break
-                
-                elif has_dollar and len(amounts) >= 2:
-                    # CRITICAL: Identify which amounts are Debit/Credit vs Balance
-                    # Strategy: Balance is typically the LAST amount and often much larger or negative
-                    # The transaction amount is one of the first 1-2 amounts
-                    
-                    if len(amounts) == 2:
-                        # FORMAT: Could be Debit+Credit OR Amount+Balance
-                        # Heuristic: if second is much larger or negative, it's balance
-                        first_val = float(amounts[0].replace('$', '').replace(',', ''))
-                        second_val = float(amounts[1].replace('$', '').replace(',', ''))
-                        
-                        # If second is negative or 3x+ larger, it's likely the balance
-                        if second_val < 0 or abs(second_val) > abs(first_val) * 3:
-                            transaction_amount = amounts[0]
-                            # Direction based on context since we don't have both debit/credit
-                            direction = "outbound" if first_val > 0 else "inbound"
-                        else:
-                            # Both are transaction amounts (debit and credit columns)
-                            # Pick non-zero one
-                            if first_val > 0:
-                                transaction_amount = amounts[0]
-                                direction = "outbound"
-                            elif second_val > 0:
-                                transaction_amount = amounts[1]
-                                direction = "inbound"
-                    
-                    elif len(amounts) == 3:
-                        # FORMAT: Debit, Credit, Balance
-                        # Last one is balance, first two are debit/credit
-                        debit_str = amounts[0]
-                        credit_str = amounts[1]
-                        balance_str = amounts[2]  # Ignore this
-                        
-                        debit_val = float(debit_str.replace('$', '').replace(',', ''))
-                        credit_val = float(credit_str.replace('$', '').replace(',', ''))
-                        
-                        # Credit (inbound) takes precedence
-                        if credit_val > 0:
-                            transaction_amount = credit_str
-                            direction = "inbound"
-                        elif debit_val > 0:
-                            transaction_amount = debit_str
-                            direction = "outbound"
-                    
-                    # Extract channel and description - BEFORE the amounts
-                    # Remove all amounts from the line first
-                    clean = remaining
-                    for a in amounts:
-                        clean = clean.replace(a, "", 1)  # Remove first occurrence
-                    
-                    tokens = clean.split()
-                    
-                    # Channel is typically the last meaningful token before amounts
-                    for t in reversed(tokens):
-                        if t.lower() in KNOWN_CHANNELS:
-                            channel = t.lower()
-                            break
-                    
-                    # Description is everything before channel
-                    desc_tokens = []
-                    for t in tokens:
-                        if t.lower() == channel:
-                            break
-                        desc_tokens.append(t)
-                    description = " ".join(desc_tokens).lower().strip()
-
-                elif not has_dollar and len(amounts) >= 1:
-                    # FORMAT 2: Mixed_200_Cases (no $)
-                    transaction_amount = f"${amounts[0]}"
-                    
-                    # Extract channel
-                    tokens = remaining.split()
-                    for t in reversed(tokens):
-                        if t.lower() in KNOWN_CHANNELS:
-                            channel = t.lower()
-                            break
-                    
-                    # Description
-                    clean = remaining
-                    for a in amounts:
-                        clean = clean.replace(a, "", 1)
-                    desc_tokens = []
-                    for t in clean.split():
-                        if t.lower() == channel:
-                            break
-                        desc_tokens.append(t)
-                    description = " ".join(desc_tokens).lower().strip()
-                    
-                    # Infer direction
-                    direction = infer_direction_from_details(description)
-                    if direction == "unknown":
-                        direction = "outbound"
+        elif not has_dollar and len(amounts) >= 1:
+            # FORMAT 2: Mixed_200_Cases (no $)
+            transaction_amount = f"${amounts[0]}"
+            
+            # Extract channel
+            channel = _last_channel(remaining_lower.split())
 
-                else:
-                    # Fallback
-                    transaction_amount = amounts[0] if amounts[0].startswith('$') else f"${amounts[0]}"
-                    direction = infer_direction_from_details(remaining)
-                    
-                    tokens = remaining.split()
-                    for t in reversed(tokens):
-                        if t.lower() in KNOWN_CHANNELS:
-                            channel = t.lower()
-                            break
-                    
-                    description = " ".join(t for t in tokens if t.lower() != channel).lower()
+            # Description
+            clean = remaining_lower
+            for a in amounts:
+                clean = clean.replace(a, "", 1)
+            description = _tokens_before(clean.split(), channel)
+            
+            # Infer direction
+            direction = infer_direction_from_details(description)
+            if direction == "unknown":
+                direction = "outbound"
+
+        else:
+            # Fallback
+            transaction_amount = amounts[0] if amounts[0].startswith('$') else f"${amounts[0]}"
+            direction = infer_direction_from_details(remaining)
+            
+            tokens = remaining_lower.split()
+            channel = _last_channel(tokens)
+            description = " ".join(t for t in tokens if t != channel)
 
-                if not transaction_amount:
-                    continue
+        if not transaction_amount:
+            continue
 
-                txs.append({
-                    "Date": date_str,
-                    "amount": transaction_amount,
-                    "Type": channel,
-                    "Details": description.strip(),
-                    "direction": direction,
-                })
+        txs.append({
+            "Date": share(date_str, date_str),
+            "amount": transaction_amount,
+            "Type": share(channel, channel),
+            "Details": description.strip(),
+            "direction": direction,
+        })
 
-    return txs
\ No newline at end of file
+    return txs
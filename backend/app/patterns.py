@@ -1,10 +1,26 @@
 # app/patterns.py
 
+import re
+import logging
 from collections import defaultdict
-from datetime import date, timedelta
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, NamedTuple, Optional
+import numpy as np
 from dateutil.parser import parse as parse_dt
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+logger = logging.getLogger(__name__)
+
 # Thresholds / config – can be tuned later
 STRUCTURING_THRESHOLD = 10000.0
 P2P_BURST_MIN_COUNT = 2
@@ -31,35 +47,80 @@ HIGH_RISK_KEYWORDS = [
     "offshore",
     "foreign wire"
 ]
+CRYPTO_KEYWORDS = [
+    "cryptoexchange",
+    "crypto exchange",
+    "crypto",
+    "coinbase",
+    "kraken",
+    "binance",
+    "kucoin",
+    "okx",
+    "crypto.com"
+]
+# layering counts any exchange movement, not just named crypto venues
+LAYERING_CRYPTO_KEYWORDS = {"crypto", "exchange", "binance", "coinbase", "kraken"}
+SALARY_KEYWORDS = {"salary", "payroll"}
+
+
+def _keyword_matcher(keywords):
+    """
+    `any(k in s for k in keywords)` as a single scan of s.
+
+    Uses a pyahocorasick automaton when installed (one linear pass over the
+    string, whatever the keyword count), else a plain substring alternation.
+    """
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for k in keywords:
+            automaton.add_word(k, k)
+        automaton.make_automaton()
+        return lambda s: next(automaton.iter(s), None) is not None
+
+    search = re.compile("|".join(map(re.escape, keywords))).search
+    return lambda s: search(s) is not None
 
-def _get_direction(tx: Dict[str, Any]) -> str:
+
+def _get_direction(tx: Dict[str, Any], details: Optional[str] = None) -> str:
     # Parser-provided direction has highest priority
-    d = (tx.get("direction") or "").lower()
+    d = tx.get("direction")
+    if d == "inbound" or d == "outbound":
+        # the parser already emits lowercase
+        return d
+    d = (d or "").lower()
     if d in {"inbound", "outbound"}:
         return d
 
-    # Fallback only if parser didn't provide it
-    return infer_direction_from_details(_get_details(tx))
-
+    # Fallback only if parser didn't provide it; callers that already hold
+    # the lowered details pass them in
+    return infer_direction_from_details(_get_details(tx) if details is None else details)
+
+INBOUND_MARKERS = (
+    "incoming", "from ", "credit", "deposit", "salary", "payroll"
+)
+OUTBOUND_MARKERS = (
+    "transfer to", "wire to", "withdrawal", "payment", "sent", "debit"
+)
+_has_inbound_marker = _keyword_matcher(INBOUND_MARKERS)
+_has_outbound_marker = _keyword_matcher(OUTBOUND_MARKERS)
+
+# Merchant descriptions repeat across a statement
+@lru_cache(maxsize=4096)
 def infer_direction_from_details(details: str) -> str:
     d = details.lower()
 
-    inbound_markers = (
-        "incoming", "from ", "credit", "deposit", "salary", "payroll"
-    )
-    outbound_markers = (
-        "transfer to", "wire to", "withdrawal", "payment", "sent", "debit"
-    )
-
-    if any(k in d for k in inbound_markers):
+    if _has_inbound_marker(d):
         return "inbound"
-    if any(k in d for k in outbound_markers):
+    if _has_outbound_marker(d):
         return "outbound"
 
     return "unknown"
 
 def _get_amount(tx):
     raw = tx.get("amount") or tx.get("Amount") or ""
+    # Excel cells arrive as numbers already; skip the str round-trip
+    if type(raw) in (int, float):
+        return float(raw)
     try:
         cleaned = (
             str(raw)
@@ -77,6 +138,24 @@ def _get_date(tx: Dict[str, Any]) -> Optional[date]:
     raw = tx.get("date") or tx.get("Date")
     if not raw:
         return None
+    return _parse_date(raw)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(raw) -> Optional[date]:
+    # Statements repeat the same few dates, and CSV/PDF rows are ISO
+    # YYYY-MM-DD, so try the native parser before dateutil's format discovery
+    if isinstance(raw, str) and len(raw) == 10 and raw[4] == "-" and raw[7] == "-":
+        try:
+            return date.fromisoformat(raw)
+        except ValueError:
+            pass
+    # MM/DD/YYYY exports: dateutil reads these month-first too
+    if isinstance(raw, str) and len(raw) == 10 and raw[2] == "/" and raw[5] == "/":
+        try:
+            return datetime.strptime(raw, "%m/%d/%Y").date()
+        except ValueError:
+            pass
     try:
         return parse_dt(raw).date()
     except Exception:
@@ -91,6 +170,155 @@ def _get_details(tx: Dict[str, Any]) -> str:
     return (tx.get("Details") or tx.get("description") or "").lower()
 
 
+# TxView.flags bits: which keyword sets the details mention
+HIGH_RISK_BIT = 1 << 0
+CRYPTO_BIT = 1 << 1
+LAYERING_CRYPTO_BIT = 1 << 2
+SALARY_BIT = 1 << 3
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# (bit, keywords, whole_words). In whole-word sets a single-token keyword
+# must be a whole token of the description ("china" doesn't hit
+# "machinery"); phrases ("hong kong", "foreign wire") and the other sets
+# match as substrings. The crypto sets stay substring so run-together
+# venue names ("cryptoexchange", "binanceus") keep matching
+_FLAG_KEYWORDS = (
+    (HIGH_RISK_BIT, HIGH_RISK_KEYWORDS, True),
+    (CRYPTO_BIT, CRYPTO_KEYWORDS, False),
+    (LAYERING_CRYPTO_BIT, LAYERING_CRYPTO_KEYWORDS, False),
+    (SALARY_BIT, SALARY_KEYWORDS, False),
+)
+
+
+def _flag_tables():
+    """keyword -> OR of the bits of every set it belongs to, split by match kind."""
+    token_bits: Dict[str, int] = defaultdict(int)
+    substring_bits: Dict[str, int] = defaultdict(int)
+    for bit, keywords, whole_words in _FLAG_KEYWORDS:
+        for k in keywords:
+            if whole_words and _TOKEN_RE.fullmatch(k):
+                token_bits[k] |= bit
+            else:
+                substring_bits[k] |= bit
+    return dict(token_bits), dict(substring_bits)
+
+
+_TOKEN_BITS, _SUBSTRING_BITS = _flag_tables()
+
+
+def _substring_automaton():
+    # One automaton over every substring keyword, so a description is
+    # scanned once for all sets
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for k, bits in _SUBSTRING_BITS.items():
+        automaton.add_word(k, bits)
+    automaton.make_automaton()
+    return automaton
+
+
+_SUBSTRING_AUTOMATON = _substring_automaton()
+
+
+def _details_flags(details: str) -> int:
+    flags = 0
+    for token in _TOKEN_RE.findall(details):
+        flags |= _TOKEN_BITS.get(token, 0)
+
+    if _SUBSTRING_AUTOMATON is not None:
+        for _, bits in _SUBSTRING_AUTOMATON.iter(details):
+            flags |= bits
+    else:
+        for k, bits in _SUBSTRING_BITS.items():
+            if k in details:
+                flags |= bits
+    return flags
+
+
+class TxView(NamedTuple):
+    """A transaction's pattern inputs, parsed once, next to the original dict."""
+    tx: Dict[str, Any]
+    amount: float
+    date: Optional[date]
+    ttype: str
+    details: str
+    direction: str
+    flags: int
+    detail_id: int  # same id <=> same details; int keys for the sender/destination maps
+
+
+def _precompute(transactions: List[Dict[str, Any]]) -> List[TxView]:
+    views = []
+    # descriptions repeat across a statement; scan and number each distinct one once
+    seen: Dict[str, tuple] = {}
+    for tx in transactions:
+        details = _get_details(tx)
+        known = seen.get(details)
+        if known is None:
+            known = seen[details] = (_details_flags(details), len(seen))
+        flags, detail_id = known
+        views.append(TxView(
+            tx, _get_amount(tx), _get_date(tx), _get_type(tx), details, _get_direction(tx, details),
+            flags, detail_id,
+        ))
+    return views
+
+
+def _window_tallies_numpy(first_days, span, sorted_day, day_order, type_code, n_types, moving, amt):
+    """
+    Per window [first_days[k], first_days[k] + span]: row count, distinct
+    type codes, summed `amt` of the `moving` rows and their count. Sums run
+    in statement order (cumsum is sequential) to match a Python `+=` loop.
+    """
+    lo = np.searchsorted(sorted_day, first_days, "left")
+    hi = np.searchsorted(sorted_day, first_days + span, "right")
+    channels = np.zeros(len(first_days), dtype=np.int64)
+    totals = np.zeros(len(first_days), dtype=np.float64)
+    moved = np.zeros(len(first_days), dtype=np.int64)
+    for k in range(len(first_days)):
+        rows = np.sort(day_order[lo[k]:hi[k]])
+        channels[k] = np.count_nonzero(np.bincount(type_code[rows], minlength=n_types))
+        amounts = amt[rows[moving[rows]]]
+        moved[k] = amounts.size
+        if amounts.size:
+            totals[k] = np.cumsum(amounts)[-1]
+    return hi - lo, channels, totals, moved
+
+
+def _window_tallies_loop(first_days, span, sorted_day, day_order, type_code, n_types, moving, amt):
+    # Same contract as _window_tallies_numpy, as plain loops for numba
+    n = first_days.shape[0]
+    counts = np.zeros(n, dtype=np.int64)
+    channels = np.zeros(n, dtype=np.int64)
+    totals = np.zeros(n, dtype=np.float64)
+    moved = np.zeros(n, dtype=np.int64)
+    for k in range(n):
+        lo = np.searchsorted(sorted_day, first_days[k], side="left")
+        hi = np.searchsorted(sorted_day, first_days[k] + span, side="right")
+        rows = np.sort(day_order[lo:hi])
+        seen = np.zeros(n_types, dtype=np.bool_)
+        total = 0.0
+        for i in rows:
+            if not seen[type_code[i]]:
+                seen[type_code[i]] = True
+                channels[k] += 1
+            if moving[i]:
+                total += amt[i]
+                moved[k] += 1
+        counts[k] = hi - lo
+        totals[k] = total
+    return counts, channels, totals, moved
+
+
+# Compiled once per process (and cached on disk) when numba is installed
+_window_tallies = (
+    njit(cache=True)(_window_tallies_loop) if njit is not None else _window_tallies_numpy
+)
+
+
 def run_patterns(transactions: List[Dict[str, Any]]):
     """
     Pattern 1 — Structuring (Near-Threshold Cash)
@@ -118,18 +346,92 @@ def run_patterns(transactions: List[Dict[str, Any]]):
     patterns: List[Dict[str, Any]] = []
     risk_score = 0
 
-    # Group by day
-    by_day: Dict[date, List[Dict[str, Any]]] = defaultdict(list)
-    for tx in transactions:
-        d = _get_date(tx)
-        if d is not None:
-            by_day[d].append(tx)
+    # Every field parsed once per transaction; patterns read the views and
+    # put the original dicts (v.tx) in their matches
+    views = _precompute(transactions)
+    dated = [v for v in views if v.date is not None]
+
+    # Columnar copies of `dated` (same order) for the windowed patterns:
+    # window and pair candidates are picked with array masks, in C, and only
+    # the survivors are walked in Python
+    dated_day = np.fromiter((v.date.toordinal() for v in dated), dtype=np.int64, count=len(dated))
+    dated_amt = np.fromiter((v.amount for v in dated), dtype=np.float64, count=len(dated))
+    dated_type = np.array([v.ttype for v in dated], dtype=str)
+    dated_flags = np.fromiter((v.flags for v in dated), dtype=np.uint16, count=len(dated))
+
+    def _dated_mask(predicate):
+        return np.fromiter((predicate(v) for v in dated), dtype=bool, count=len(dated))
+
+    # Day-sorted index for the time windows: each window is a searchsorted
+    # slice instead of a scan over every dated row
+    day_order = np.argsort(dated_day, kind="stable")
+    sorted_day = dated_day[day_order]
+
+    def _window(first_day, last_day):
+        """Indexes into `dated` with first_day <= day <= last_day, in statement order."""
+        lo = np.searchsorted(sorted_day, first_day, "left")
+        hi = np.searchsorted(sorted_day, last_day, "right")
+        return np.sort(day_order[lo:hi])
+
+    # Group by day and channel in one sweep: day -> type -> indexes into
+    # `dated`, ascending, so the same-day patterns look channels up directly
+    by_day_type: Dict[date, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+    for i, v in enumerate(dated):
+        by_day_type[v.date][v.ttype].append(i)
+
+    def _day_views(by_type, *types):
+        """Views of the given channels for one day, in statement order."""
+        if len(types) == 1:
+            indexes = by_type.get(types[0], ())
+        else:
+            indexes = sorted(i for t in types for i in by_type.get(t, ()))
+        return [dated[i] for i in indexes]
+
+    def _inbound_smurf_hit(day, electronic):
+        """Inbound smurfing check for one day's electronic (p2p/ach/wire) credits."""
+        eligible_inbounds = []
+        unique_senders = set()
+
+        # Only electronic inbound credits (NO CASH)
+        for v in electronic:
+            # Must be inbound
+            if v.direction != "inbound":
+                continue
+
+            # Smurf-sized only
+            if v.amount >= INBOUND_SMURF_MAX_SINGLE:
+                continue
+
+            eligible_inbounds.append(v)
+            # sender proxy (synthetic-safe)
+            unique_senders.add(v.detail_id)
+
+        # Minimum transaction count
+        if len(eligible_inbounds) < INBOUND_SMURF_MIN_COUNT:
+            return None
+
+        # Require distinct senders
+        if len(unique_senders) < INBOUND_SMURF_MIN_SENDERS:
+            return None
+
+        total_amount = sum(v.amount for v in eligible_inbounds)
+        if total_amount < INBOUND_SMURF_MIN_TOTAL:
+            return None
+
+        # ✅ STORE THE HIT
+        return {
+            "date": str(day),
+            "transactions": [v.tx for v in eligible_inbounds],
+            "count": len(eligible_inbounds),
+            "unique_senders": len(unique_senders),
+            "total_amount": total_amount,
+        }
 
     # --- Pattern 1: Structuring (Near-Threshold Cash) ---
     structuring_hits: List[Dict[str, Any]] = []
-    for tx in transactions:
-        if _get_type(tx) == "cash" and 9900 < _get_amount(tx) < STRUCTURING_THRESHOLD:
-            structuring_hits.append(tx)
+    for v in views:
+        if v.ttype == "cash" and 9900 < v.amount < STRUCTURING_THRESHOLD:
+            structuring_hits.append(v.tx)
 
     if structuring_hits:
         patterns.append({
@@ -140,11 +442,17 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         })
         risk_score += 3
 
-    # --- Pattern 2: Cash → Wire Same Day ---
+    # --- Same-day patterns (2, inbound smurfing, 3), in one sweep over the days ---
     cash_wire_hits: List[Dict[str, Any]] = []
-    for day, txs in by_day.items():
-        cash_txs = [t for t in txs if _get_type(t) == "cash"]
-        wire_txs = [t for t in txs if _get_type(t) == "wire" and _get_amount(t) > 5000]
+    inbound_smurf_hits = []
+    p2p_hits: List[Dict[str, Any]] = []
+
+    for day, by_type in by_day_type.items():
+        p2p_views = _day_views(by_type, "p2p")
+
+        # Pattern 2: Cash → Wire Same Day
+        cash_txs = [v.tx for v in _day_views(by_type, "cash")]
+        wire_txs = [v.tx for v in _day_views(by_type, "wire") if v.amount > 5000]
         if cash_txs and wire_txs:
             cash_wire_hits.append({
                 "date": str(day),
@@ -152,6 +460,28 @@ def run_patterns(transactions: List[Dict[str, Any]]):
                 "wire_transactions": wire_txs,
             })
 
+        # INBOUND SMURFING (multi small inbound credits)
+        smurf_hit = _inbound_smurf_hit(day, _day_views(by_type, "p2p", "ach", "wire"))
+        if smurf_hit is not None:
+            inbound_smurf_hits.append(smurf_hit)
+
+        # Pattern 3: Multiple P2P Transfers (Layering / Burst)
+        count = len(p2p_views)
+        if p2p_views:
+            # aggregated rows like "multiple small P2P transfers"
+            has_aggregated_row = any(
+                ("multiple" in v.details and "transfer" in v.details) for v in p2p_views
+            )
+
+            # Normal burst: >= 2 P2P on same day
+            # Exception: a single aggregated "multiple transfers" row
+            if count >= P2P_BURST_MIN_COUNT or (count == 1 and has_aggregated_row):
+                p2p_hits.append({
+                    "date": str(day),
+                    "p2p_count": count,
+                    "transactions": [v.tx for v in p2p_views],
+                })
+
     if cash_wire_hits:
         patterns.append({
             "code": "RAPID_CASH_TO_WIRE",
@@ -161,55 +491,6 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         })
         risk_score += 4
 
-    # --- Pattern: INBOUND SMURFING (multi small inbound credits) ---
-    inbound_smurf_hits = []
-
-    for day, txs in by_day.items():
-        eligible_inbounds = []
-        unique_senders = set()
-
-        for t in txs:
-            ttype = _get_type(t)
-            amount = _get_amount(t)
-            details = _get_details(t)
-
-            # Only electronic inbound credits (NO CASH)
-            if ttype not in ("p2p", "ach", "wire"):
-                continue
-
-            # Must be inbound
-            if _get_direction(t) != "inbound":
-                continue
-
-            # Smurf-sized only
-            if amount >= INBOUND_SMURF_MAX_SINGLE:
-                continue
-
-            eligible_inbounds.append(t)
-            # sender proxy (synthetic-safe)
-            unique_senders.add(details)
-
-        # Minimum transaction count
-        if len(eligible_inbounds) < INBOUND_SMURF_MIN_COUNT:
-            continue
-
-        # Require distinct senders
-        if len(unique_senders) < INBOUND_SMURF_MIN_SENDERS:
-            continue
-
-        total_amount = sum(_get_amount(t) for t in eligible_inbounds)
-        if total_amount < INBOUND_SMURF_MIN_TOTAL:
-            continue
-
-        # ✅ STORE THE HIT
-        inbound_smurf_hits.append({
-            "date": str(day),
-            "transactions": eligible_inbounds,
-            "count": len(eligible_inbounds),
-            "unique_senders": len(unique_senders),
-            "total_amount": total_amount,
-        })
-    
     # ✅ Append pattern ONCE, AFTER loop
     if inbound_smurf_hits:
         patterns.append({
@@ -220,30 +501,6 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         })
         risk_score += 4
 
-    # --- Pattern 3: Multiple P2P Transfers (Layering / Burst) ---
-    p2p_hits: List[Dict[str, Any]] = []
-    for day, txs in by_day.items():
-        p2p_txs = [t for t in txs if _get_type(t) == "p2p"]
-        count = len(p2p_txs)
-
-        if not p2p_txs:
-            continue
-
-        details_list = [_get_details(t) for t in p2p_txs]
-        # aggregated rows like "multiple small P2P transfers"
-        has_aggregated_row = any(
-            ("multiple" in d and "transfer" in d) for d in details_list
-        )
-
-        # Normal burst: >= 2 P2P on same day
-        # Exception: a single aggregated "multiple transfers" row
-        if count >= P2P_BURST_MIN_COUNT or (count == 1 and has_aggregated_row):
-            p2p_hits.append({
-                "date": str(day),
-                "p2p_count": count,
-                "transactions": p2p_txs,
-            })
-
     if p2p_hits:
         patterns.append({
             "code": "P2P_MULTIPLE_TRANSFERS_SAME_DAY",
@@ -256,48 +513,32 @@ def run_patterns(transactions: List[Dict[str, Any]]):
     # --- Pattern 5: Crypto-to-bank flow ---
     crypto_hits: List[Dict[str, Any]] = []
 
-    CRYPTO_KEYWORDS = [
-        "cryptoexchange",
-        "crypto exchange",
-        "crypto",
-        "coinbase",
-        "kraken",
-        "binance",
-        "kucoin",
-        "okx",
-        "crypto.com"
-    ]
-
-    # Extract all transactions with valid dates
-    dated_txs = [(t, _get_date(t)) for t in transactions if _get_date(t)]
-
     # Identify inbound crypto-related deposits
-    crypto_deposits = []
-    for tx, d in dated_txs:
-        details = _get_details(tx)
-        if any(k in details for k in CRYPTO_KEYWORDS) and _get_direction(tx) == "inbound":
-            crypto_deposits.append((tx, d))
-
-    # Look for outbound flows (wire/P2P) within a 48-hour window
-    for crypto_tx, crypto_date in crypto_deposits:
-        related_outflows = []
+    crypto_deposits = [
+        dated[i] for i in np.flatnonzero(dated_flags & CRYPTO_BIT)
+        if dated[i].direction == "inbound"
+    ]
 
-        for t, d in dated_txs:
-            if not d:
-                continue
+    # no crypto deposits → nothing to pair, skip the outflow scan
+    if crypto_deposits:
+        # outbound movement
+        crypto_outflow_ok = np.isin(dated_type, ("wire", "p2p", "ach")) & (
+            dated_amt >= CRYPTO_MIN_OUTFLOW
+        )
 
+        # Look for outbound flows (wire/P2P) within a 48-hour window
+        for deposit in crypto_deposits:
             # Time window ±2 days
-            if abs((d - crypto_date).days) <= 2:
-                # outbound movement
-                if _get_type(t) in ("wire", "p2p", "ach") and _get_amount(t) >= CRYPTO_MIN_OUTFLOW:
-                    related_outflows.append(t)
-
-        if related_outflows:
-            crypto_hits.append({
-                "crypto_deposit": crypto_tx,
-                "related_outflows": related_outflows,
-                "deposit_date": str(crypto_date)
-            })
+            deposit_day = deposit.date.toordinal()
+            in_window = _window(deposit_day - 2, deposit_day + 2)
+            related_outflows = [dated[i].tx for i in in_window[crypto_outflow_ok[in_window]]]
+
+            if related_outflows:
+                crypto_hits.append({
+                    "crypto_deposit": deposit.tx,
+                    "related_outflows": related_outflows,
+                    "deposit_date": str(deposit.date)
+                })
 
     if crypto_hits:
         patterns.append({
@@ -309,12 +550,9 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         risk_score += 7
 
     # --- Pattern 6: High-risk jurisdiction wires ---
-    high_risk_hits: List[Dict[str, Any]] = []
-    for tx in transactions:
-        if _get_type(tx) == "wire":
-            details = _get_details(tx)
-            if any(keyword in details for keyword in HIGH_RISK_KEYWORDS):
-                high_risk_hits.append(tx)
+    high_risk_hits: List[Dict[str, Any]] = [
+        v.tx for v in views if v.ttype == "wire" and v.flags & HIGH_RISK_BIT
+    ]
 
     if high_risk_hits:
         patterns.append({
@@ -327,13 +565,13 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         risk_score += 7
 
     # --- Pattern 7: ATM structuring ---
-    atm_txs = [
-        tx for tx in transactions
-        if _get_type(tx) == "atm" or "atm withdrawal" in _get_details(tx)
+    atm_views = [
+        v for v in views
+        if v.ttype == "atm" or "atm withdrawal" in v.details
     ]
     atm_struct_hits = [
-        tx for tx in atm_txs
-        if ATM_STRUCT_MIN_AMOUNT <= _get_amount(tx) < ATM_STRUCT_MAX_AMOUNT
+        v.tx for v in atm_views
+        if ATM_STRUCT_MIN_AMOUNT <= v.amount < ATM_STRUCT_MAX_AMOUNT
     ]
 
     if len(atm_struct_hits) >= ATM_STRUCT_MIN_COUNT:
@@ -352,42 +590,35 @@ def run_patterns(transactions: List[Dict[str, Any]]):
     inbound_types = {"cash", "ach", "check"}
     outbound_types = {"wire", "ach", "p2p"}
 
-    # collect all tx with dates
-    dated = [(tx, _get_date(tx)) for tx in transactions if _get_date(tx)]
-
-    for in_tx, in_date in dated:
-        in_type = _get_type(in_tx)
-        in_amt = _get_amount(in_tx)
-
-        # inbound criteria
-        if _get_direction(in_tx) != "inbound":
-            continue
-        if in_amt < 5000:
-            continue
+    # outbound candidates (written as negated `<` so NaN amounts pass as before)
+    rapid_out_ok = np.isin(dated_type, list(outbound_types)) & ~(dated_amt < 5000)
 
-        # search for matching outbound within 24 hr window
-        for out_tx, out_date in dated:
-            out_type = _get_type(out_tx)
-            out_amt = _get_amount(out_tx)
+    # no large outbound candidate anywhere → no inbound can be drained
+    if rapid_out_ok.any():
+        for inbound_view in dated:
+            in_amt = inbound_view.amount
 
-            if out_type not in outbound_types:
+            # inbound criteria
+            if inbound_view.direction != "inbound":
                 continue
-            if out_amt < 5000:
+            if in_amt < 5000:
                 continue
 
+            # search for matching outbound within 24 hr window
+            in_day = inbound_view.date.toordinal()
             # time window: same day or ±1 day
-            if abs((out_date - in_date).days) > 1:
-                continue
-
-            # net outflow rule: outbound ≥ 80% of inbound
-            if out_amt < in_amt * 0.80:
-                continue
-
-            rapid_outflow_hits.append({
-                "inbound": in_tx,
-                "outbound": out_tx,
-                "time_delta_days": (out_date - in_date).days
-            })
+            in_window = _window(in_day - 1, in_day + 1)
+            candidates = in_window[
+                rapid_out_ok[in_window]
+                # net outflow rule: outbound ≥ 80% of inbound
+                & ~(dated_amt[in_window] < in_amt * 0.80)
+            ]
+            for i in candidates:
+                rapid_outflow_hits.append({
+                    "inbound": inbound_view.tx,
+                    "outbound": dated[i].tx,
+                    "time_delta_days": int(dated_day[i] - in_day)
+                })
 
     if rapid_outflow_hits:
         patterns.append({
@@ -401,79 +632,77 @@ def run_patterns(transactions: List[Dict[str, Any]]):
     # --- Pattern 9: LAYERING_ACTIVITY ---
     layering_hits = []
 
-    SALARY_KEYWORDS = {"salary", "payroll"}
-    CRYPTO_KEYWORDS = {"crypto", "exchange", "binance", "coinbase", "kraken"}
-
     SALARY_MAX = 5000          # salary-sized upper bound
     MIN_LARGE_TX = 6000        # meaningful laundering threshold
     WINDOW_DAYS = 7
     MIN_CHANNELS = 3
     # ⛔ removed salary/payroll — those are used as camouflage in AML
 
-    # prepare dated transactions WITH direction
-    dated = [
-        (
-            tx,
-            _get_date(tx),
-            _get_amount(tx),
-            _get_type(tx),
-            _get_details(tx),
+    # checked once: the window trace is per anchor and costly to format
+    trace = logger.isEnabledFor(logging.DEBUG)
+
+    # A window depends only on its first day, so tally each distinct day once:
+    # rows, channels, and the movement (crypto is always suspicious movement,
+    # otherwise outbound rows) summed in statement order
+    _, type_code = np.unique(dated_type, return_inverse=True)
+    n_types = int(type_code.max(initial=-1)) + 1
+
+    # fewer channels in the whole statement than a window needs → no hits
+    if n_types >= MIN_CHANNELS:
+        layering_moving = (dated_flags & LAYERING_CRYPTO_BIT).astype(bool) | _dated_mask(
+            lambda v: v.direction == "outbound"
         )
-        for tx in transactions
-        if _get_date(tx) is not None
-    ]
-    
-    for start_tx, start_date, start_amt, start_type, start_details in dated:
-        print("Evaluating tx for layering:",start_tx, start_amt)
-        # ignore salary-sized anchors
-        if start_amt <= SALARY_MAX and any(k in start_details for k in SALARY_KEYWORDS):
-            continue
-
-        window_end = start_date + timedelta(days=WINDOW_DAYS)
-
-        window = [
-            (tx, d, amt, ttype, details)
-            for tx, d, amt, ttype, details in dated
-            if start_date <= d <= window_end
-        ]
-
-        if len(window) < 4:
-            continue
-
-        channels_used = set()
-        total_movement = 0.0
-        outbound_count = 0
-
-        for tx, d, amt, ttype, details in window:
-            direction = _get_direction(tx)
-            # register channel
-            channels_used.add(ttype)
-
-            # crypto is always suspicious movement
-            if any(k in details for k in CRYPTO_KEYWORDS):
-                total_movement += amt
-                outbound_count += 1
+        start_days = np.unique(dated_day)
+        window_rows, window_channels, window_totals, window_moved = _window_tallies(
+            start_days, WINDOW_DAYS, sorted_day, day_order,
+            type_code.astype(np.int64), n_types, layering_moving, dated_amt,
+        )
+        tally_of_day = {int(day): k for k, day in enumerate(start_days)}
+
+        for start in dated:
+            start_date = start.date
+            if trace:
+                logger.debug("Evaluating tx for layering: %s %s", start.tx, start.amount)
+            # ignore salary-sized anchors
+            if start.amount <= SALARY_MAX and start.flags & SALARY_BIT:
                 continue
 
-            if direction == "outbound":
-                total_movement += amt
-                outbound_count += 1
-        print("  -> window total movement:", total_movement, "across", len(channels_used), "channels and", outbound_count, "outbound txns")
-        if len(channels_used) < MIN_CHANNELS:
-            continue
+            window_end = start_date + timedelta(days=WINDOW_DAYS)
 
-        if total_movement < MIN_LARGE_TX:
-            continue
-        
-        layering_hits.append({
-        "window_start": str(start_date),
-        "window_end": str(window_end),
-        "channels_used": list(channels_used),
-        "channel_count": len(channels_used),
-        "total_movement": total_movement,
-        "transactions": [t[0] for t in window],
-        })
+            start_day = start_date.toordinal()
+            k = tally_of_day[start_day]
+
+            if window_rows[k] < 4:
+                continue
+
+            total_movement = float(window_totals[k])
+            if trace:
+                logger.debug(
+                    "  -> window total movement: %s across %d channels and %d outbound txns",
+                    total_movement, window_channels[k], window_moved[k],
+                )
+            if window_channels[k] < MIN_CHANNELS:
+                continue
+
+            if total_movement < MIN_LARGE_TX:
+                continue
+
+            window = [dated[i] for i in _window(start_day, start_day + WINDOW_DAYS)]
+            # register channels in window order, as the hit lists them
+            channels_used = set()
+            for v in window:
+                channels_used.add(v.ttype)
+
+            layering_hits.append({
+            "window_start": str(start_date),
+            "window_end": str(window_end),
+            "channels_used": list(channels_used),
+            "channel_count": len(channels_used),
+            "total_movement": total_movement,
+            "transactions": [v.tx for v in window],
+            })
         
+
     if layering_hits:
         patterns.append({
                 "code": "LAYERING_ACTIVITY",
@@ -495,12 +724,26 @@ def run_patterns(transactions: List[Dict[str, Any]]):
     MIN_TOTAL_INBOUND = 10000
     CONSOLIDATION_RATIO = 0.80
 
-    # group by date for rolling windows
-    dated = [(tx, _get_date(tx)) for tx in transactions if _get_date(tx)]
-
-    for anchor_tx, anchor_date in dated:
-        window_start = anchor_date
-        window_end = anchor_date + timedelta(days=WINDOW_DAYS)
+    # per-row inbound / outbound tests, once; the windows only visit matches
+    funnel_in_ok = np.isin(dated_type, ("p2p", "ach", "wire")) & _dated_mask(
+        lambda v: "incoming" in v.details or "from" in v.details or "credit" in v.details
+    )
+    funnel_out_ok = np.isin(dated_type, ("wire", "p2p")) & (dated_amt > 0)
+    funnel_any = funnel_in_ok | funnel_out_ok
+
+    # Running counts over the day-sorted rows: a window's inbound / outbound
+    # counts are a difference of two prefix entries, so windows that can't
+    # reach MIN_INBOUND_TX or have no exit are dropped without being walked
+    inbound_prefix = np.concatenate(([0], np.cumsum(funnel_in_ok[day_order])))
+    outbound_prefix = np.concatenate(([0], np.cumsum(funnel_out_ok[day_order])))
+
+    def _funneling_window(anchor_day):
+        lo = np.searchsorted(sorted_day, anchor_day, "left")
+        hi = np.searchsorted(sorted_day, anchor_day + WINDOW_DAYS, "right")
+        if inbound_prefix[hi] - inbound_prefix[lo] < MIN_INBOUND_TX:
+            return None
+        if outbound_prefix[hi] == outbound_prefix[lo]:
+            return None
 
         inbound = []
         inbound_senders = set()
@@ -508,55 +751,64 @@ def run_patterns(transactions: List[Dict[str, Any]]):
         outbound = []
         outbound_destinations = defaultdict(float)
 
-        for tx, tx_date in dated:
-            if not (window_start <= tx_date <= window_end):
-                continue
-
-            ttype = _get_type(tx)
-            details = _get_details(tx)
-            amount = _get_amount(tx)
+        in_window = np.sort(day_order[lo:hi])
+        for i in in_window[funnel_any[in_window]]:
+            v = dated[i]
 
             # inbound detection
-            if ttype in ("p2p", "ach", "wire") and (
-                "incoming" in details or "from" in details or "credit" in details
-            ):
-                inbound.append(tx)
-                inbound_senders.add(details)  # synthetic sender proxy
+            if funnel_in_ok[i]:
+                inbound.append(v)
+                inbound_senders.add(v.detail_id)  # synthetic sender proxy
 
             # outbound detection
-            if ttype in ("wire", "p2p") and amount > 0:
-                outbound.append(tx)
-                outbound_destinations[details] += amount
-
-        # inbound checks
-        if len(inbound) < MIN_INBOUND_TX:
-            continue
+            if funnel_out_ok[i]:
+                outbound.append(v.tx)
+                outbound_destinations[v.detail_id] += v.amount
 
-        inbound_total = sum(_get_amount(t) for t in inbound)
+        inbound_total = sum(v.amount for v in inbound)
         if inbound_total < MIN_TOTAL_INBOUND:
-            continue
+            return None
 
         # require multiple distinct senders
         if len(inbound_senders) < MIN_INBOUND_TX:
-            continue
+            return None
 
         # outbound consolidation check
-        if not outbound:
-            continue
-
         max_single_destination = max(outbound_destinations.values())
         if max_single_destination < inbound_total * CONSOLIDATION_RATIO:
-            continue
+            return None
 
-        funneling_hits.append({
-            "window_start": str(window_start),
-            "window_end": str(window_end),
+        return {
             "inbound_count": len(inbound),
             "inbound_total": inbound_total,
             "outbound_consolidated_amount": max_single_destination,
-            "inbound_transactions": inbound,
+            "inbound_transactions": [v.tx for v in inbound],
             "outbound_transactions": outbound,
-        })
+        }
+
+    # too few inbound credits or no exit in the whole statement → no window hits
+    if funnel_in_ok.sum() >= MIN_INBOUND_TX and funnel_out_ok.any():
+        # the window depends only on the anchor's day; evaluate each day once
+        window_of_day: Dict[int, Optional[Dict[str, Any]]] = {}
+
+        for anchor in dated:
+            anchor_date = anchor.date
+            anchor_day = anchor_date.toordinal()
+            if anchor_day not in window_of_day:
+                window_of_day[anchor_day] = _funneling_window(anchor_day)
+            hit = window_of_day[anchor_day]
+            if hit is None:
+                continue
+
+            funneling_hits.append({
+                "window_start": str(anchor_date),
+                "window_end": str(anchor_date + timedelta(days=WINDOW_DAYS)),
+                "inbound_count": hit["inbound_count"],
+                "inbound_total": hit["inbound_total"],
+                "outbound_consolidated_amount": hit["outbound_consolidated_amount"],
+                "inbound_transactions": list(hit["inbound_transactions"]),
+                "outbound_transactions": list(hit["outbound_transactions"]),
+            })
 
     # append pattern once
     if funneling_hits:
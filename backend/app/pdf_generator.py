@@ -1,5 +1,8 @@
 # app/pdf_generator.py
 
+import os
+import shutil
+import hashlib
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from pathlib import Path
@@ -7,14 +10,82 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 REPORTS_DIR = BASE_DIR / "reports"
 REPORTS_DIR.mkdir(exist_ok=True)
+# Rendered reports keyed by narrative content, linked out to each job's path.
+# Only the REPORT_CACHE_MAX_FILES most recently used are kept; a job's own
+# report is a separate link, so evicting an entry never breaks it
+CACHE_DIR = REPORTS_DIR / ".by_content"
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", "256"))
+
+
+def _body_text(c: canvas.Canvas, y: float):
+    body = c.beginText(50, y)
+    body.setFont("Helvetica", 10, leading=12)
+    return body
 
 
 def make_pdf(job_id: str, sar_text: str) -> str:
     """
     Create a simple one- or two-page PDF with the SAR narrative text.
+
+    The output depends only on sar_text, so each distinct narrative is
+    rendered once into CACHE_DIR (named by its BLAKE2 digest) and the job's
+    report is a hard link to it (a copy where links aren't supported).
+    Returns the path as a plain string so job state only ever holds the
+    filename, never the PDF bytes.
     """
     pdf_path = REPORTS_DIR / f"sar_{job_id}.pdf"
 
+    if sar_text is None:
+        sar_text = ""
+    sar_text = str(sar_text)
+
+    key = hashlib.blake2b(sar_text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+    cached = CACHE_DIR / f"{key}.pdf"
+    try:
+        os.utime(cached)  # LRU: a hit counts as recent use
+        hit = True
+    except FileNotFoundError:
+        hit = False
+    if not hit:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp = cached.with_suffix(f".{os.getpid()}.{job_id}.tmp")
+        _render_pdf(tmp, sar_text)
+        os.replace(tmp, cached)
+
+    pdf_path.unlink(missing_ok=True)
+    try:
+        os.link(cached, pdf_path)
+    except FileNotFoundError:
+        # Evicted by another worker in between; the job still gets its report
+        _render_pdf(pdf_path, sar_text)
+    except OSError:
+        shutil.copyfile(cached, pdf_path)
+    if not hit:
+        _prune_report_cache()
+    return str(pdf_path)
+
+
+def _prune_report_cache():
+    """Drops the least recently used reports beyond REPORT_CACHE_MAX_FILES."""
+    entries = []
+    for f in CACHE_DIR.glob("*.pdf"):
+        try:
+            entries.append((f.stat().st_mtime, f))
+        except FileNotFoundError:
+            pass  # pruned by another worker
+    if len(entries) <= REPORT_CACHE_MAX_FILES:
+        return
+    entries.sort()
+    for _, f in entries[:len(entries) - REPORT_CACHE_MAX_FILES]:
+        f.unlink(missing_ok=True)
+
+
+def _render_pdf(pdf_path: Path, sar_text: str):
+    """
+    Render the report. The canvas writes straight to pdf_path (no BytesIO
+    buffer), and each page is flushed with showPage(), so memory stays
+    bounded regardless of SAR length.
+    """
     c = canvas.Canvas(str(pdf_path), pagesize=A4)
     width, height = A4
     y = height - 50
@@ -24,36 +95,26 @@ def make_pdf(job_id: str, sar_text: str) -> str:
     c.drawString(50, y, "AML Case Summary")
     y -= 30
 
-    # Body text
-    c.setFont("Helvetica", 10)
-
-    if sar_text is None:
-        sar_text = ""
+    # Body text: one text object per page, so consecutive lines share a
+    # single BT/ET block and advance by leading instead of re-positioning
+    body = _body_text(c, y)
 
-    for raw_line in str(sar_text).splitlines():
+    for raw_line in sar_text.splitlines():
         line = raw_line.strip()
         if not line:
+            body.textLine("")
             y -= 12
             continue
 
         # simple wrapping at ~110 characters
-        while len(line) > 110:
-            segment = line[:110]
-            c.drawString(50, y, segment)
+        for start in range(0, len(line), 110):
+            body.textLine(line[start:start + 110])
             y -= 12
-            line = line[110:]
             if y < 60:
+                c.drawText(body)
                 c.showPage()
                 y = height - 50
-                c.setFont("Helvetica", 10)
-
-        c.drawString(50, y, line)
-        y -= 12
-
-        if y < 60:
-            c.showPage()
-            y = height - 50
-            c.setFont("Helvetica", 10)
+                body = _body_text(c, y)
 
+    c.drawText(body)
     c.save()
-    return str(pdf_path)
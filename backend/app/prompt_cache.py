@@ -0,0 +1,119 @@
+# app/prompt_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import orjson
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+PROMPT_CACHE_TTL_SECONDS = 86400
+LOCATION_CACHE_TTL_SECONDS = 30 * 86400
+PROMPT_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / ".llm_cache.sqlite3"),
+)
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}|{prompt.strip()}".encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Exact-match LLM response cache on disk, keyed by sha256(model | prompt).
+
+    Backed by a single sqlite file so cached responses survive restarts and
+    are shared by every worker on the host. Entries expire after `ttl`
+    seconds; expired rows are ignored on read and purged on write.
+    """
+
+    def __init__(self, path: str = PROMPT_CACHE_PATH, ttl: int = PROMPT_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT response FROM prompt_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM prompt_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO prompt_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, now + self.ttl),
+            )
+
+
+class LocationCache:
+    """
+    Persistent description -> location map, shared across jobs.
+
+    Merchant descriptions repeat between statements, so enrich_locations
+    looks them up here first and only sends the unknown ones to the LLM.
+    Lives in the same sqlite file as PromptCache; values are orjson-encoded
+    so a null location (nothing found) is cached too.
+    """
+
+    def __init__(self, path: str = PROMPT_CACHE_PATH, ttl: int = LOCATION_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS location_cache ("
+                " details TEXT PRIMARY KEY,"
+                " location BLOB NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get_many(self, details: Iterable[str]) -> Dict[str, object]:
+        details = list(details)
+        found = {}
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # Chunked to stay under sqlite's bound-parameter limit
+            for i in range(0, len(details), 500):
+                chunk = details[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT details, location FROM location_cache"
+                    f" WHERE details IN ({marks}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall()
+                found.update((d, orjson.loads(loc)) for d, loc in rows)
+        return found
+
+    def set_many(self, locations: Dict[str, object]):
+        if not locations:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM location_cache WHERE expires_at <= ?", (now,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO location_cache (details, location, expires_at) VALUES (?, ?, ?)",
+                [(d, orjson.dumps(loc), now + self.ttl) for d, loc in locations.items()],
+            )
+
+
+PROMPT_CACHE = PromptCache()
+LOCATION_CACHE = LocationCache()
@@ -1,3 +1,4 @@
+import asyncio
 from llm_client import generate_sar
 
 # simple dummy test
@@ -10,6 +11,6 @@ patterns = [
     {"rule": "large_amount", "matches": [{"amount": 15000}]}
 ]
 
-sar = generate_sar(transactions, patterns)
+sar = asyncio.run(generate_sar(transactions, patterns))
 print("\n--- SAR OUTPUT ---\n")
 print(sar)
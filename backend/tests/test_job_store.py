@@ -0,0 +1,63 @@
+# tests/test_job_store.py
+#
+# JobQueue's maxsize on the Redis path, against an in-memory stand-in for
+# the two calls it makes. Run from backend/: python -m pytest tests
+
+import asyncio
+
+from app.job_store import JobQueue
+
+
+class FakeRedis:
+    """RPUSH plus the queue's push-if-room script, on a Python list."""
+
+    def __init__(self):
+        self.lists = {}
+
+    async def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    async def eval(self, script, numkeys, key, value, maxsize):
+        assert script == JobQueue.PUSH_IF_ROOM
+        items = self.lists.setdefault(key, [])
+        if len(items) < int(maxsize):
+            items.append(value)
+            return 1
+        return 0
+
+
+def _redis_queue(maxsize):
+    queue = JobQueue(maxsize=maxsize)
+    queue._redis = FakeRedis()
+    queue.FULL_POLL_SECONDS = 0.01
+    return queue
+
+
+def test_redis_put_waits_while_full():
+    queue = _redis_queue(maxsize=2)
+    items = lambda: queue._redis.lists[JobQueue.KEY]
+
+    async def go():
+        await queue.put("a")
+        await queue.put("b")
+        third = asyncio.create_task(queue.put("c"))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        assert items() == ["a", "b"]
+
+        items().pop(0)  # a worker takes "a"
+        await asyncio.wait_for(third, 1)
+        assert items() == ["b", "c"]
+
+    asyncio.run(go())
+
+
+def test_redis_unbounded_when_maxsize_zero():
+    queue = _redis_queue(maxsize=0)
+
+    async def go():
+        for i in range(5):
+            await queue.put(str(i))
+
+    asyncio.run(go())
+    assert len(queue._redis.lists[JobQueue.KEY]) == 5
@@ -0,0 +1,115 @@
+# tests/test_jobs.py
+#
+# The job pipeline in app.jobs, with the LLM, PDF and TTS steps stubbed.
+# Run from backend/: python -m pytest tests
+
+import asyncio
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from app import jobs
+
+INPUTS_DIR = Path(__file__).resolve().parent / "inputs"
+LONDON = {"location_city": "London", "location_country": "United Kingdom",
+          "location_lat": 51.5, "location_lng": -0.12}
+
+
+def _walk_txs(node, out):
+    if isinstance(node, list):
+        for item in node:
+            _walk_txs(item, out)
+    elif isinstance(node, dict):
+        if "Details" in node:
+            out.append(node)
+        else:
+            for value in node.values():
+                _walk_txs(value, out)
+    return out
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """Runs process_uploaded_file on a test input; returns (statuses, job)."""
+    statuses = []
+    update = jobs.JOB_STORE.update
+
+    async def spy_update(job_id, **fields):
+        if "status" in fields:
+            statuses.append(fields["status"])
+        await update(job_id, **fields)
+
+    sar_done = asyncio.Event()
+
+    async def fake_enrich(transactions):
+        await sar_done.wait()  # outlasts the SAR call
+        return [{**tx, **LONDON} for tx in transactions], "1 country"
+
+    async def fake_sar(job_id, transactions, patterns, risk_score, risk_band):
+        asyncio.get_running_loop().call_soon(sar_done.set)
+        return "SAR TEXT"
+
+    def fake_pdf(job_id, sar_text):
+        path = tmp_path / f"{job_id}.pdf"
+        path.write_bytes(b"%PDF")
+        return str(path)
+
+    def fake_tts(sar_text, audio_path):
+        Path(audio_path).write_bytes(b"ID3")
+        return audio_path
+
+    monkeypatch.setattr(jobs.JOB_STORE, "update", spy_update)
+    monkeypatch.setattr(jobs, "enrich_locations", fake_enrich)
+    monkeypatch.setattr(jobs, "_generate_sar_streaming", fake_sar)
+    monkeypatch.setattr(jobs, "make_pdf", fake_pdf)
+    monkeypatch.setattr(jobs, "_run_gtts", fake_tts)
+    monkeypatch.setattr(jobs, "_CPU_POOL", ThreadPoolExecutor(max_workers=2))
+    monkeypatch.setattr(jobs, "_TTS_POOL", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.chdir(tmp_path)  # the pipeline's debug logs land here
+
+    def run(input_name):
+        src = tmp_path / input_name
+        shutil.copy(INPUTS_DIR / input_name, src)
+        job_id = f"test-{input_name}"
+
+        async def go():
+            await update(job_id, status="queued", file=str(src))
+            await jobs.process_uploaded_file(job_id)
+            return await jobs.JOB_STORE.get(job_id)
+
+        return statuses, asyncio.run(go())
+
+    return run
+
+
+def test_status_sequence(pipeline):
+    statuses, job = pipeline("funneling_activity_case_01.csv")
+
+    assert job["status"] == "done", job.get("error")
+    assert statuses == ["parsing", "enriching", "rules", "llm", "enriching", "pdf", "audio", "done"]
+
+
+def test_pattern_matches_carry_locations(pipeline):
+    _, job = pipeline("funneling_activity_case_01.csv")
+
+    patterns = job["result"]["patterns"]
+    matched = _walk_txs([p.get("matches") for p in patterns], [])
+    assert patterns and matched
+    for tx in matched:
+        assert tx["location_country"] == "United Kingdom"
+
+
+def test_failure_is_logged_not_written(pipeline, monkeypatch, tmp_path, caplog):
+    async def broken_sar(job_id, transactions, patterns, risk_score, risk_band):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(jobs, "_generate_sar_streaming", broken_sar)
+    _, job = pipeline("funneling_activity_case_01.csv")
+
+    assert job["status"] == "error"
+    assert job["error"] == "boom"
+    record = next(r for r in caplog.records if r.getMessage().startswith("Job test-"))
+    assert record.exc_info is not None
+    assert not (tmp_path / "debug_error.log").exists()
@@ -0,0 +1,43 @@
+# tests/test_llm_client.py
+#
+# The deterministic fallback narrative in app.llm_client.
+# Run from backend/: python -m pytest tests
+
+import asyncio
+
+from app import llm_client
+
+
+def _tx(i, amount):
+    return {"Date": f"2024-01-{i:02d}", "Type": "WIRE", "amount": str(amount),
+            "direction": "outbound", "Details": f"payment {i}"}
+
+
+def test_fallback_lists_first_statement_rows(monkeypatch):
+    monkeypatch.setattr(llm_client, "OPENROUTER_KEY", "")
+    # Later rows carry larger amounts, so a signal-ranked sample would differ
+    transactions = [_tx(i, 100 * i) for i in range(1, 31)]
+
+    sar = asyncio.run(llm_client.generate_sar(transactions, []))
+
+    section = sar.split("2. What Happened")[1].split("\n3. ")[0]
+    examples = [line[2:] for line in section.splitlines() if line.startswith("- ")]
+    assert examples == [llm_client.format_tx_for_sar(tx) for tx in transactions[:5]]
+
+
+def test_fallback_without_transactions(monkeypatch):
+    monkeypatch.setattr(llm_client, "OPENROUTER_KEY", "")
+
+    sar = asyncio.run(llm_client.generate_sar([], []))
+
+    assert "no transactions available for review" in sar
+
+
+def test_prompt_selection_drops_duplicates_and_keeps_order():
+    small = [_tx(i, 10) for i in range(1, 6)]
+    big = [_tx(i, 10_000) for i in range(6, 9)]
+    transactions = small[:2] + [big[0], big[0]] + small[2:] + big[1:]
+
+    selected = llm_client.select_txs_for_sar(transactions, limit=3)
+
+    assert selected == big
@@ -0,0 +1,63 @@
+# tests/test_main.py
+#
+# Result payloads served by app.main. Run from backend/: python -m pytest tests
+
+import asyncio
+
+import orjson
+from starlette.requests import Request
+
+from app import main
+from app.jobs import _write_transactions
+
+
+def _request():
+    return Request({"type": "http", "method": "GET", "headers": []})
+
+
+def _store_done_job(job_id, tx_ref, preview):
+    asyncio.run(main.JOB_STORE.update(
+        job_id,
+        status="done",
+        result={
+            "transactions_ref": tx_ref,
+            "transactions_preview": preview,
+            "transaction_count": 3,
+            "risk_score": 4,
+        },
+    ))
+
+
+TXS = [{"Date": f"2024-01-0{i}", "amount": i * 100.0, "Details": f"tx {i}"} for i in (1, 2, 3)]
+
+
+def test_result_rehydrates_transactions_from_jsonl(tmp_path):
+    tx_path = _write_transactions(TXS, tmp_path / "job_transactions.jsonl")
+    _store_done_job("rehydrate", str(tx_path), TXS[:1])
+
+    body = orjson.loads(asyncio.run(main.result("rehydrate", _request())).body)
+
+    assert body["transactions"] == TXS
+    assert body["transaction_count"] == 3
+    assert "transactions_ref" not in body
+    assert "transactions_preview" not in body
+
+
+def test_result_falls_back_to_preview_without_jsonl(tmp_path):
+    _store_done_job("no-file", str(tmp_path / "missing.jsonl"), TXS[:1])
+
+    body = orjson.loads(asyncio.run(main.result("no-file", _request())).body)
+
+    assert body["transactions"] == TXS[:1]
+    assert "transactions_ref" not in body
+
+
+def test_status_hides_internal_result_keys(tmp_path):
+    _store_done_job("status", str(tmp_path / "job.jsonl"), TXS[:1])
+
+    job = asyncio.run(main.status("status"))
+
+    assert job["status"] == "done"
+    assert job["result"]["transactions"] == TXS[:1]
+    assert "transactions_ref" not in job["result"]
+    assert "transactions_preview" not in job["result"]
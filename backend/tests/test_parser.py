@@ -0,0 +1,112 @@
+# tests/test_parser.py
+#
+# PDF text extraction in app.parser. Run from backend/: python -m pytest tests
+
+import random
+
+import pytest
+from reportlab.pdfgen import canvas
+
+from app import parser
+
+pymupdf = pytest.importorskip("pymupdf")
+
+
+def _mixed_font_statement(path, rows=40):
+    """
+    Debit/Credit/Balance statement where every cell of a row shares a
+    baseline but not a font size, so word bottoms differ by a few points.
+    """
+    r = random.Random(1)
+    c = canvas.Canvas(str(path))
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 800, "Date Description Channel Debit Credit Balance")
+    y = 780.0
+    for i in range(rows):
+        y -= 14.3
+        c.setFont("Helvetica", 10)
+        c.drawString(40, y, f"2024-01-{i % 28 + 1:02d}")
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(110, y, r.choice(["Payment to vendor", "Salary deposit", "Wire to acme"]))
+        c.setFont("Helvetica", 10)
+        c.drawString(260, y, r.choice(["ACH", "Wire", "Card"]))
+        c.setFont("Helvetica", 11)
+        c.drawString(320, y, f"${r.randint(100, 9000):,}.00")
+        c.drawString(400, y, "$0.00")
+        c.setFont("Helvetica", 8)
+        c.drawString(470, y, f"${r.randint(20000, 90000):,}.00")
+    c.save()
+
+
+def test_pymupdf_matches_pdfplumber_on_mixed_fonts(tmp_path, monkeypatch):
+    pdf = tmp_path / "mixed.pdf"
+    _mixed_font_statement(pdf)
+
+    monkeypatch.setattr(parser, "PDF_ENGINE", "pymupdf")
+    fast = parser._extract_from_pdf(pdf)
+    monkeypatch.setattr(parser, "PDF_ENGINE", "pdfplumber")
+    reference = parser._extract_from_pdf(pdf)
+
+    assert len(reference) == 40
+    assert fast == reference
+
+
+def test_pymupdf_line_keeps_row_order(tmp_path):
+    pdf = tmp_path / "mixed.pdf"
+    _mixed_font_statement(pdf, rows=3)
+
+    with pymupdf.open(pdf) as doc:
+        lines = parser._pymupdf_page_text(doc.load_page(0)).splitlines()
+
+    assert lines[0] == "Date Description Channel Debit Credit Balance"
+    rows = lines[1:]
+    assert len(rows) == 3
+    for row in rows:
+        # date first, then description, then debit / credit / balance in column order
+        assert parser.DATE_RE.match(row)
+        assert row.split()[-2] == "$0.00"
+
+
+def test_pooled_pdf_parse_matches_sequential(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    pdf = tmp_path / "long.pdf"
+    c = canvas.Canvas(str(pdf))
+    for page in range(parser.PDF_PARALLEL_MIN_PAGES + 3):
+        y = 800
+        for i in range(20):
+            c.drawString(40, y, f"2024-02-{i + 1:02d} ${page * 100 + i + 1:,}.00 Wire Outbound page {page}")
+            y -= 14
+        c.showPage()
+    c.save()
+
+    sequential = parser._extract_from_pdf(pdf)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        pooled = parser._extract_from_pdf(pdf, pool)
+
+    assert len(sequential) == 20 * (parser.PDF_PARALLEL_MIN_PAGES + 3)
+    assert pooled == sequential
+
+
+def test_pdf_cache_is_keyed_by_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, "PDF_CACHE_DIR", tmp_path / "cache")
+    pdf = tmp_path / "mixed.pdf"
+    _mixed_font_statement(pdf, rows=5)
+    first = parser.extract_transactions(str(pdf))
+
+    # Same bytes under another name is a hit; the parser isn't called again
+    copy = tmp_path / "renamed.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    monkeypatch.setattr(parser, "_extract_from_pdf", lambda *a: pytest.fail("cache miss"))
+    assert parser.extract_transactions(str(copy)) == first
+
+
+def test_pdf_cache_keeps_most_recent_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, "PDF_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(parser, "PDF_CACHE_MAX_FILES", 2)
+    for rows in (1, 2, 3):
+        pdf = tmp_path / f"statement_{rows}.pdf"
+        _mixed_font_statement(pdf, rows=rows)
+        parser.extract_transactions(str(pdf))
+
+    assert len(list((tmp_path / "cache").glob("*.pkl"))) == 2
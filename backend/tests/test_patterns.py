@@ -0,0 +1,62 @@
+# tests/test_patterns.py
+#
+# Keyword flag matching in app.patterns. Run from backend/: python -m pytest tests
+
+import pytest
+
+from app.patterns import (
+    _details_flags,
+    _get_details,
+    HIGH_RISK_BIT,
+    CRYPTO_BIT,
+    LAYERING_CRYPTO_BIT,
+    SALARY_BIT,
+)
+
+
+def details_flags(details: str) -> int:
+    # same lowercasing as run_patterns applies to each transaction
+    return _details_flags(_get_details({"Details": details}))
+
+
+@pytest.mark.parametrize("details", [
+    "ACME Machinery Parts",   # "china" inside a word
+    "GUAE Trading",           # "uae" inside a word
+    "offshoreline marina",    # "offshore" inside a word
+])
+def test_high_risk_single_words_need_whole_tokens(details):
+    assert not details_flags(details) & HIGH_RISK_BIT
+
+
+@pytest.mark.parametrize("details", [
+    "wire to china ltd",
+    "uae remittance",
+    "offshore account transfer",
+    "incoming foreign wire",
+    "hong kong branch",
+])
+def test_high_risk_keywords_match(details):
+    assert details_flags(details) & HIGH_RISK_BIT
+
+
+@pytest.mark.parametrize("details", [
+    "CryptoExchange deposit",
+    "Crypto.com purchase",
+    "BinanceUS withdrawal",
+    "coinbase pro",
+])
+def test_crypto_venues_match_as_substrings(details):
+    flags = details_flags(details)
+    assert flags & CRYPTO_BIT
+    assert flags & LAYERING_CRYPTO_BIT
+
+
+def test_layering_counts_any_exchange():
+    flags = details_flags("fx exchange transfer")
+    assert flags & LAYERING_CRYPTO_BIT
+    assert not flags & CRYPTO_BIT
+
+
+def test_salary_flag():
+    assert details_flags("acme payroll") & SALARY_BIT
+    assert not details_flags("grocery store") & SALARY_BIT
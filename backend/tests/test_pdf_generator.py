@@ -0,0 +1,40 @@
+# tests/test_pdf_generator.py
+#
+# The content-addressed report cache in app.pdf_generator.
+# Run from backend/: python -m pytest tests
+
+import os
+from pathlib import Path
+
+import pytest
+
+from app import pdf_generator
+
+
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_generator, "REPORTS_DIR", tmp_path)
+    monkeypatch.setattr(pdf_generator, "CACHE_DIR", tmp_path / ".by_content")
+    monkeypatch.setattr(pdf_generator, "REPORT_CACHE_MAX_FILES", 2)
+    return tmp_path
+
+
+def _cached(reports):
+    return sorted(p.name for p in (reports / ".by_content").glob("*.pdf"))
+
+
+def test_cache_keeps_most_recent_reports(reports):
+    paths = []
+    for i, text in enumerate(["first", "second", "first", "third"]):
+        paths.append(Path(pdf_generator.make_pdf(f"job{i}", text)))
+        # Stamp the entry just used, so LRU order doesn't depend on timer resolution
+        for entry in (reports / ".by_content").glob("*.pdf"):
+            if os.path.samefile(entry, paths[-1]):
+                os.utime(entry, (i, i))
+
+    assert len(_cached(reports)) == 2
+    # "second" was the least recently used; every job keeps its report
+    second = paths[1].read_bytes()
+    assert all(p.read_bytes() != second for p in
+               (reports / ".by_content").glob("*.pdf"))
+    assert all(p.stat().st_size > 0 for p in paths)
@@ -1,54 +1,252 @@
-import json
+import os
+import sys
+import hashlib
+import argparse
 import time
+import uuid
+import atexit
+import pickle
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    # stdlib json.loads takes bytes as well
+    from json import loads as json_loads
+
+try:
+    import ormsgpack
+except ImportError:
+    ormsgpack = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 API_BASE = "http://localhost:8000"  # FastAPI base URL
 
 BASE_DIR = Path(__file__).resolve().parent
+APP_DIR = BASE_DIR.parent / "app"
 CASES_DIR = BASE_DIR / "cases"
 INPUTS_DIR = BASE_DIR / "inputs"
+# Parsed case files keyed by (path, mtime_ns, size), reused across runs
+CASE_CACHE_PATH = BASE_DIR / ".cache" / "cases.pkl"
+# Final job results keyed by (backend source fingerprint, input file digest).
+# Only read with --reuse, so a plain run always exercises the backend
+RESULT_CACHE_PATH = BASE_DIR / ".cache" / "results.pkl"
+
+# One pooled keep-alive session for every upload / poll / fetch; idempotent
+# calls retry briefly on gateway errors while the backend restarts
+SESSION = requests.Session()
+SESSION.mount(
+    "http://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.1, status_forcelist=[502, 503, 504]),
+    ),
+)
+SESSION.headers.update({"Accept": "application/json"})
+
+# Status polling backs off from POLL_MIN_SECONDS to POLL_MAX_SECONDS
+POLL_MIN_SECONDS = 0.05
+POLL_MAX_SECONDS = 1.0
+POLL_BACKOFF = 1.5
+
+# Cases run concurrently; each is mostly waiting on the backend
+MAX_WORKERS = 8
+PRINT_LOCK = threading.Lock()
+RESULT_LOCK = threading.Lock()
+
+# Read size for uploads and input/source digests
+UPLOAD_CHUNK_BYTES = 1 << 16
+
+
+def log(*args):
+    # one whole line at a time while cases run concurrently
+    with PRINT_LOCK:
+        print(*args)
 
 
 # -----------------------------
 # Load test case definitions
 # -----------------------------
+def _read_cache(path: Path) -> dict:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+
+def _write_cache(path: Path, data: dict):
+    try:
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
 def load_cases():
-    for case_file in CASES_DIR.glob("*.json"):
-        with open(case_file, "r", encoding="utf-8") as f:
-            case = json.load(f)
-        case["_file_path"] = case_file
-        yield case
+    cached = _read_cache(CASE_CACHE_PATH)
+    # only this run's files are written back, so deleted cases drop out
+    seen = {}
+
+    # Plain listing + suffix test is cheaper than glob's pattern matching;
+    # sorted so cases are submitted in the same order every run
+    for case_file in sorted(CASES_DIR.iterdir()):
+        if case_file.suffix != ".json":
+            continue
+        st = case_file.stat()
+        key = (str(case_file), st.st_mtime_ns, st.st_size)
+        case = cached.get(key)
+        if case is None:
+            case = json_loads(case_file.read_bytes())
+        seen[key] = case
+        yield {
+            **case,
+            "expected_patterns": frozenset(case.get("expected_patterns", ())),
+            "_file_path": case_file,
+        }
+
+    if seen.keys() != cached.keys():
+        atexit.register(_write_cache, CASE_CACHE_PATH, seen)
+
+
+# -----------------------------
+# Input digests (result cache keys)
+# -----------------------------
+def _new_hash():
+    # Not a security boundary, so the fast non-cryptographic hash when present
+    return xxhash.xxh3_64() if xxhash is not None else hashlib.blake2b(digest_size=16)
+
+
+def _hash_file(h, file_path: Path):
+    with open(file_path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_BYTES):
+            h.update(chunk)
+
+
+def file_digest(file_path: Path) -> str:
+    h = _new_hash()
+    _hash_file(h, file_path)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def backend_fingerprint() -> str:
+    """Digest of the backend's app/*.py sources; any code change invalidates cached results."""
+    h = _new_hash()
+    for src in sorted(APP_DIR.rglob("*.py")):
+        h.update(str(src.relative_to(APP_DIR)).encode())
+        _hash_file(h, src)
+    return h.hexdigest()
 
 
 # -----------------------------
 # Upload input file
 # -----------------------------
+def _multipart_body(f, filename: str, boundary: str):
+    """multipart/form-data body for one "file" field, read from f in chunks."""
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    while chunk := f.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
 def upload_file(file_path: Path) -> str:
     url = f"{API_BASE}/api/upload"
+    # Streamed (chunked transfer) rather than `files=`, which builds the
+    # whole multipart body in memory before sending
+    boundary = uuid.uuid4().hex
     with open(file_path, "rb") as f:
-        files = {"file": (file_path.name, f, "application/octet-stream")}
-        resp = requests.post(url, files=files)
+        resp = SESSION.post(
+            url,
+            data=_multipart_body(f, file_path.name, boundary),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
 
     resp.raise_for_status()
-    return resp.json()["job_id"]
+    return json_loads(resp.content)["job_id"]
 
 
 # -----------------------------
-# Poll job STATUS (not result!)
+# Wait for job STATUS (not result!)
 # -----------------------------
-def wait_for_status(job_id: str, timeout_sec: int = 60):
+def wait_for_status(job_id: str, timeout_sec: int = 60, out=log):
+    data = wait_for_status_stream(job_id, timeout_sec, out)
+    if data is not None:
+        return data
+    return poll_status(job_id, timeout_sec, out)
+
+
+def wait_for_status_stream(job_id: str, timeout_sec: int = 60, out=log):
+    """
+    Follow /api/status/stream/{job_id} (server-sent events) until the job is
+    done or failed. Returns None when the backend has no stream endpoint or
+    the stream ends early, so the caller can fall back to polling.
+    """
+    url = f"{API_BASE}/api/status/stream/{job_id}"
+    start = time.time()
+
+    try:
+        with SESSION.get(url, stream=True, timeout=(5, timeout_sec),
+                         headers={"Accept": "text/event-stream"}) as resp:
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = json_loads(line[5:])
+
+                status = data.get("status")
+                out(f"  Stream status: {status}")
+
+                if status in ("done", "error"):
+                    return data
+
+                if time.time() - start > timeout_sec:
+                    raise TimeoutError(f"Job {job_id} did not complete in time.")
+    except requests.exceptions.ReadTimeout:
+        raise TimeoutError(f"Job {job_id} did not complete in time.")
+
+    return None
+
+
+def poll_status(job_id: str, timeout_sec: int = 60, out=log):
     url = f"{API_BASE}/api/status/{job_id}"
     start = time.time()
+    delay = POLL_MIN_SECONDS
 
     while True:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        data = resp.json()
-
-        status = data.get("status")
-        print(f"  Polling status: {status}")
+        # HEAD carries the state in X-Job-Status; the full payload is only
+        # fetched once the job is terminal (or the header isn't supported)
+        head = SESSION.head(url)
+        status = head.headers.get("X-Job-Status") if head.ok else None
+        if status is None or status in ("done", "error"):
+            resp = SESSION.get(url)
+            resp.raise_for_status()
+            data = json_loads(resp.content)
+            status = data.get("status")
+
+        out(f"  Polling status: {status}")
 
         if status in ("done", "error"):
             return data
@@ -56,7 +254,8 @@ def wait_for_status(job_id: str, timeout_sec: int = 60):
         if time.time() - start > timeout_sec:
             raise TimeoutError(f"Job {job_id} did not complete in time.")
 
-        time.sleep(1)
+        time.sleep(delay)
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_SECONDS)
 
 
 # -----------------------------
@@ -64,9 +263,14 @@ def wait_for_status(job_id: str, timeout_sec: int = 60):
 # -----------------------------
 def fetch_result(job_id: str):
     url = f"{API_BASE}/api/result/{job_id}"
-    resp = requests.get(url)
+    # Ask for MessagePack when we can decode it; the backend answers JSON
+    # if it can't produce it
+    headers = {"Accept": "application/msgpack, application/json"} if ormsgpack is not None else None
+    resp = SESSION.get(url, headers=headers)
     resp.raise_for_status()
-    return resp.json()
+    if resp.headers.get("Content-Type", "").startswith("application/msgpack"):
+        return ormsgpack.unpackb(resp.content)
+    return json_loads(resp.content)
 
 
 # -----------------------------
@@ -84,38 +288,59 @@ def compute_risk_band(score: int) -> str:
 # -----------------------------
 # Run a single test case
 # -----------------------------
-def run_case(case: dict):
+def run_case(case: dict, result_cache: dict, reuse: bool = False):
+    # Output is collected per case and written in one piece, so concurrent
+    # cases never interleave lines
+    lines = []
+    try:
+        return _run_case(case, lines.append, result_cache, reuse)
+    finally:
+        with PRINT_LOCK:
+            sys.stdout.write("".join(f"{line}\n" for line in lines))
+            sys.stdout.flush()
+
+
+def _run_case(case: dict, out, result_cache: dict, reuse: bool):
     case_id = case["id"]
     input_file = case["input_file"]
 
-    expected_patterns = set(case.get("expected_patterns", []))
+    expected_patterns = case["expected_patterns"]
     expected_risk_band = case.get("expected_risk_band")
     expected_recommendation = case.get("expected_recommendation")
 
-    print(f"\n=== Running test case: {case_id} ===")
-    print(f"Description: {case.get('description', '')}")
+    out(f"\n=== Running test case: {case_id} ===")
+    out(f"Description: {case.get('description', '')}")
 
     file_path = INPUTS_DIR / input_file
     if not file_path.exists():
-        print(f"[FAIL] Input file not found: {file_path}")
+        out(f"[FAIL] Input file not found: {file_path}")
         return False
 
-    # 1) Upload file
-    job_id = upload_file(file_path)
-    print(f"  Uploaded, job_id = {job_id}")
+    key = (backend_fingerprint(), file_digest(file_path))
+    with RESULT_LOCK:
+        result = result_cache.get(key) if reuse else None
 
-    # 2) Wait for job completion
-    status_data = wait_for_status(job_id)
+    if result is not None:
+        out(f"  Input and backend unchanged, reusing cached result ({key[1]})")
+    else:
+        # 1) Upload file
+        job_id = upload_file(file_path)
+        out(f"  Uploaded, job_id = {job_id}")
 
-    if status_data.get("status") == "error":
-        print(f"[FAIL] Backend error: {status_data.get('error')}")
-        return False
+        # 2) Wait for job completion
+        status_data = wait_for_status(job_id, out=out)
 
-    # 3) Fetch final result
-    result = fetch_result(job_id)
+        if status_data.get("status") == "error":
+            out(f"[FAIL] Backend error: {status_data.get('error')}")
+            return False
+
+        # 3) Fetch final result
+        result = fetch_result(job_id)
+        with RESULT_LOCK:
+            result_cache[key] = result
 
     result_patterns = result.get("patterns", [])
-    actual_pattern_codes = {p.get("code") for p in result_patterns if p.get("code")}
+    actual_pattern_codes = {code for p in result_patterns if (code := p.get("code"))}
     actual_risk_score = int(result.get("risk_score", 0))
     actual_risk_band = result.get("risk_band") or compute_risk_band(actual_risk_score)
     actual_recommendation = result.get("final_recommendation")
@@ -124,37 +349,37 @@ def run_case(case: dict):
 
     # Pattern check (subset match)
     if not expected_patterns.issubset(actual_pattern_codes):
-        print("  [FAIL] Patterns mismatch")
-        print(f"    Expected (subset): {sorted(expected_patterns)}")
-        print(f"    Actual:            {sorted(actual_pattern_codes)}")
+        out("  [FAIL] Patterns mismatch")
+        out(f"    Expected (subset): {sorted(expected_patterns)}")
+        out(f"    Actual:            {sorted(actual_pattern_codes)}")
         ok = False
     else:
-        print(f"  [OK] Patterns: {sorted(actual_pattern_codes)}")
+        out(f"  [OK] Patterns: {sorted(actual_pattern_codes)}")
 
     # Risk band check
     if expected_risk_band and expected_risk_band != actual_risk_band:
-        print(
+        out(
             f"  [FAIL] Risk band mismatch. "
             f"Expected {expected_risk_band}, got {actual_risk_band}"
         )
         ok = False
     else:
-        print(f"  [OK] Risk band: {actual_risk_band}")
+        out(f"  [OK] Risk band: {actual_risk_band}")
 
     # Recommendation check
     if expected_recommendation and expected_recommendation != actual_recommendation:
-        print(
+        out(
             f"  [FAIL] Recommendation mismatch. "
             f"Expected {expected_recommendation}, got {actual_recommendation}"
         )
         ok = False
     else:
-        print(f"  [OK] Recommendation: {actual_recommendation}")
+        out(f"  [OK] Recommendation: {actual_recommendation}")
 
     if ok:
-        print(f"[PASS] {case_id}")
+        out(f"[PASS] {case_id}")
     else:
-        print(f"[FAIL] {case_id}")
+        out(f"[FAIL] {case_id}")
 
     return ok
 
@@ -163,11 +388,40 @@ def run_case(case: dict):
 # Run all test cases
 # -----------------------------
 def main():
-    all_ok = True
-
-    for case in load_cases():
-        ok = run_case(case)
-        all_ok = all_ok and ok
+    parser = argparse.ArgumentParser(description="Run the backend test cases.")
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="skip cases whose input and backend sources are unchanged since a cached result",
+    )
+    args = parser.parse_args()
+
+    # Pre-flight: fail fast if the backend is down, and leave a warm
+    # keep-alive connection in the pool for the first upload
+    try:
+        SESSION.get(f"{API_BASE}/healthz", timeout=2).raise_for_status()
+    except requests.RequestException as e:
+        raise SystemExit(f"Backend unreachable at {API_BASE}: {e}")
+
+    # Results from older backend sources can never match again; drop them
+    fingerprint = backend_fingerprint()
+    result_cache = {
+        key: result
+        for key, result in _read_cache(RESULT_CACHE_PATH).items()
+        if isinstance(key, tuple) and key[0] == fingerprint
+    }
+    cached_before = dict(result_cache)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = [
+            pool.submit(run_case, case, result_cache, args.reuse)
+            for case in load_cases()
+        ]
+        results = [f.result() for f in as_completed(futures)]
+    all_ok = all(results)
+
+    if result_cache != cached_before:
+        _write_cache(RESULT_CACHE_PATH, result_cache)
 
     print("\n======================================")
     if all_ok:
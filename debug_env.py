@@ -1,13 +1,11 @@
 
 import os
-from dotenv import load_dotenv
+from backend._bootstrap import ensure_env
 
-# Try explicit path
-env_path = os.path.join(os.getcwd(), 'backend', '.env')
+# backend/.env, loaded once per process
+env_path = ensure_env()
 print(f"Checking for .env at: {env_path}")
-print(f"File exists: {os.path.exists(env_path)}")
-
-load_dotenv(dotenv_path=env_path)
+print(f"File exists: {env_path.exists()}")
 
 key = os.getenv("OPENROUTER_API_KEY")
 print(f"API Key loaded: {'YES' if key else 'NO'}")
@@ -1,24 +1,31 @@
 
-import os
-import sys
+import asyncio
+import time
+from backend._bootstrap import ensure_env
 
-# Add backend to path
-sys.path.append(os.path.join(os.getcwd(), 'backend'))
+# backend/.env + backend on sys.path
+ensure_env()
 
-from app.llm_client import enrich_locations
+from app.llm_client import enrich_locations, LOCATION_BATCH_SIZE
 
-# Mock transactions
+# Mock transactions: 64 distinct merchants so the run spans several
+# LOCATION_BATCH_SIZE prompts, not one request per transaction
+MERCHANTS = ["STARBUCKS", "UBER", "TESCO", "SHELL", "AMAZON MKTPLACE", "HILTON", "ZARA", "MCDONALDS"]
+CITIES = ["LONDON", "PARIS", "BERLIN", "MADRID", "DUBAI", "NEW YORK", "SINGAPORE", "TORONTO"]
 dummy_txs = [
-    {"Date": "2023-01-01", "Details": "STARBUCKS LONDON", "amount": 5.00},
-    {"Date": "2023-01-02", "Details": "UBER PARIS", "amount": 15.00}
+    {"Date": f"2023-01-{i % 28 + 1:02d}", "Details": f"{m} {c}", "amount": 5.00 + i}
+    for i, (m, c) in enumerate((m, c) for m in MERCHANTS for c in CITIES)
 ]
-
 print("Testing enrich_locations...")
 try:
-    enriched, summary = enrich_locations(dummy_txs)
+    start = time.perf_counter()
+    enriched, summary = asyncio.run(enrich_locations(dummy_txs))
+    elapsed = time.perf_counter() - start
+    located = sum(1 for tx in enriched if tx.get("location_country"))
     print("Success!")
+    print(f"{len(dummy_txs)} txs, batch size {LOCATION_BATCH_SIZE}: {elapsed:.2f}s, {located} located")
     print("Summary:", summary)
-    print("Enriched TXs:", enriched)
+    print("Enriched TXs:", enriched[:4])
 except Exception as e:
     print("Error:", e)
     import traceback